@@ -0,0 +1,100 @@
+"""Items/sec of CouchDB writes against a local stub with artificial latency.
+
+python -m benchmarks.couchdb --items 2000 --latency 0.05
+"""
+
+import argparse
+import os
+from time import perf_counter
+
+import requests
+from scrapy import Spider
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, reactor, task
+
+from benchmarks.stubs import CouchDBStub
+from parsers.exporters import CouchDBExporter
+from parsers.pipelines import CouchDBPipeline
+
+
+def make_items(count, run):
+    return [
+        {"id": f"article-{i}", "title": f"title {run}", "context": "x" * 2000}
+        for i in range(count)
+    ]
+
+
+def bench_blocking(stub, items, batch_size):
+    exporter = CouchDBExporter(
+        requests.Session(), stub.url, "articles", batch_size=batch_size
+    )
+    start = perf_counter()
+    exporter.start_exporting()
+    for item in items:
+        exporter.export_item(item)
+    exporter.finish_exporting()
+    return perf_counter() - start
+
+
+@defer.inlineCallbacks
+def bench_pipeline(items, batch_size, concurrency):
+    settings = get_project_settings().copy_to_dict()
+    settings["COUCHDB_BATCH_SIZE"] = batch_size
+    settings["COUCHDB_CONCURRENCY"] = concurrency
+    spider = Spider.from_crawler(get_crawler(Spider, settings), name="benchmark")
+
+    # Longest gap between ticks shows how long the reactor thread was blocked
+    ticks = []
+    ticker = task.LoopingCall(lambda: ticks.append(perf_counter()))
+    ticker.start(0.005)
+
+    pipeline = CouchDBPipeline()
+    start = perf_counter()
+    pipeline.open_spider(spider)
+    yield defer.DeferredList(
+        [defer.maybeDeferred(pipeline.process_item, item, spider) for item in items]
+    )
+    yield pipeline.close_spider(spider)
+    elapsed = perf_counter() - start
+
+    ticker.stop()
+    stall = max(b - a for a, b in zip(ticks, ticks[1:])) if len(ticks) > 1 else 0
+    return elapsed, stall
+
+
+@defer.inlineCallbacks
+def main(args):
+    with CouchDBStub(latency=args.latency) as stub:
+        os.environ["COUCHDB_HOST"] = stub.url
+        elapsed = bench_blocking(stub, make_items(args.items, 0), args.batch_size)
+        print(
+            f"blocking exporter       {args.items / elapsed:10.1f} items/s"
+            f"  reactor blocked {elapsed:.3f}s"
+        )
+        for run, concurrency in enumerate(args.concurrency, start=1):
+            items = make_items(args.items, run)
+            elapsed, stall = yield bench_pipeline(items, args.batch_size, concurrency)
+            print(
+                f"pipeline concurrency={concurrency:<2} {args.items / elapsed:10.1f}"
+                f" items/s  longest reactor stall {stall:.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], metavar="N"
+    )
+    args = parser.parse_args()
+
+    def run():
+        d = main(args)
+        d.addErrback(lambda failure: failure.printTraceback())
+        d.addBoth(lambda _: reactor.stop())
+
+    reactor.callWhenRunning(run)
+    reactor.run()
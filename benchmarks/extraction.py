@@ -0,0 +1,90 @@
+"""Articles parsed per second, selector-per-field vs `ArticleExtractor`.
+
+python -m benchmarks.extraction [--fixtures DIR] [--rounds 5]
+"""
+
+import argparse
+from collections import Counter
+from time import perf_counter
+
+from benchmarks.fixtures import is_article, load_corpus, make_response, synthetic_corpus
+from parsers.spiders.appledaily import AppleDailySpider
+
+
+def extract_with_selectors(response):
+    # Field extraction as `parse_news` did it before `parsers.extractors`
+    context_selector = response.xpath("//*[@id='articleBody']/section[2]/p")
+    return {
+        "title": response.xpath(
+            "//*[@id='article-header']/header/div/h1/span/text()"
+        ).get(),
+        "subtitle": response.xpath(
+            "//*[@id='article-header']/header/p/span/text()"
+        ).get(),
+        "summary": "".join(
+            response.xpath(
+                "//*[@id='articleBody']/section[2]/p[1]/descendant-or-self::*/text()"
+            ).getall()
+        ),
+        "context": "\n".join(
+            [
+                "".join(sel.xpath("descendant-or-self::*/text()").getall())
+                for sel in context_selector
+            ],
+        ),
+        "rich_context": response.xpath("//*[@id='article-body']/self::node()").get(),
+        "author": context_selector.re_first(r"【(.*)】"),
+        "third_party": context_selector.re_first(r"本文由(.*)提供"),
+        "image_url": response.xpath("/html/head/meta[@property='og:image']").attrib[
+            "content"
+        ],
+        "image_type": response.xpath(
+            "/html/head/meta[@property='og:image:type']"
+        ).attrib["content"],
+        "published_at": response.xpath(
+            "//*[@id='article-header']/div/div/text()"
+        ).getall()[1],
+    }
+
+
+def extract_with_extractor(response):
+    return AppleDailySpider.extract_article(response.selector.root)
+
+
+def bench(extract, pages, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        # Fresh responses, so HTML parsing is included like in a crawl
+        responses = [make_response(url, html) for url, html in pages]
+        start = perf_counter()
+        for response in responses:
+            extract(response)
+        best = min(best, perf_counter() - start)
+    return len(pages) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="directory of recorded pages")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.fixtures) if args.fixtures else synthetic_corpus()
+    pages = [(url, html) for url, html in corpus.items() if is_article(url)]
+
+    # Fields where both extractions disagree, the selector regexes run on
+    # paragraph HTML while `ArticleExtractor` matches paragraph text
+    mismatches = Counter()
+    for url, html in pages:
+        before = extract_with_selectors(make_response(url, html))
+        after = extract_with_extractor(make_response(url, html))
+        mismatches.update(name for name in before if before[name] != after[name])
+    print(f"{len(pages)} articles, differing fields: {dict(mismatches)}")
+    before = bench(extract_with_selectors, pages, args.rounds)
+    after = bench(extract_with_extractor, pages, args.rounds)
+    print(f"selectors        {before:8.1f} articles/s")
+    print(f"extractor        {after:8.1f} articles/s  ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Articles extracted per second and reactor stalls, inline vs worker processes.
+
+python -m benchmarks.extraction_pool [--fixtures DIR] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+from time import perf_counter
+
+from twisted.internet import defer, reactor, task
+
+from benchmarks.fixtures import is_article, load_corpus, make_response, synthetic_corpus
+from parsers.extractors import ExtractionPool
+from parsers.spiders.appledaily import AppleDailySpider
+
+HEARTBEAT = 0.01
+
+
+class Heartbeat:
+    # Longest time the reactor didn't run a call scheduled every HEARTBEAT
+    # seconds, what a download or a pipeline would wait for
+
+    def __init__(self):
+        self.last = perf_counter()
+        self.max_stall = 0.0
+        self.loop = task.LoopingCall(self.beat)
+
+    def beat(self):
+        now = perf_counter()
+        self.max_stall = max(self.max_stall, now - self.last - HEARTBEAT)
+        self.last = now
+
+    def start(self):
+        self.last = perf_counter()
+        self.loop.start(HEARTBEAT, now=False)
+
+    def stop(self):
+        self.loop.stop()
+
+
+def extract_inline(pages):
+    # One page per reactor iteration, like the scraper calling `parse_news`
+    def work():
+        for url, html in pages:
+            AppleDailySpider.extract_article(make_response(url, html).selector.root)
+            yield
+
+    return task.cooperate(work()).whenDone()
+
+
+@defer.inlineCallbacks
+def bench(pages, workers, queue_size):
+    pool = None
+    if workers:
+        pool = ExtractionPool(AppleDailySpider.site, workers, queue_size)
+        # Start the worker processes before timing
+        yield defer.DeferredList([pool.extract(html) for _, html in pages[:workers]])
+    heartbeat = Heartbeat()
+    heartbeat.start()
+    start = perf_counter()
+    if pool is None:
+        yield extract_inline(pages)
+    else:
+        yield defer.DeferredList(
+            [pool.extract(make_response(url, html).text) for url, html in pages],
+            fireOnOneErrback=True,
+        )
+        pool.close()
+    elapsed = perf_counter() - start
+    heartbeat.stop()
+    return len(pages) / elapsed, heartbeat.max_stall
+
+
+@defer.inlineCallbacks
+def run(pages, worker_counts, queue_size):
+    baseline = None
+    print(f"{len(pages)} articles, {os.cpu_count()} CPUs")
+    try:
+        for workers in [0, *worker_counts]:
+            rate, stall = yield bench(pages, workers, queue_size or 2 * workers)
+            baseline = baseline or rate
+            label = f"{workers} workers" if workers else "inline"
+            print(
+                f"{label:<10} {rate:8.1f} articles/s  ({rate / baseline:.2f}x)  "
+                f"max reactor stall {stall * 1000:7.1f} ms"
+            )
+    finally:
+        reactor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="directory of recorded pages")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--queue-size", type=int, help="pages in the pool (default: 2 * workers)"
+    )
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.fixtures) if args.fixtures else synthetic_corpus()
+    pages = [(url, html) for url, html in corpus.items() if is_article(url)]
+    reactor.callWhenRunning(run, pages, args.workers, args.queue_size)
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
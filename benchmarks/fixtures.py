@@ -0,0 +1,131 @@
+"""HTML fixtures shaped like tw.appledaily.com archive and article pages.
+
+Recorded pages can be replayed instead of the synthetic ones: put them in a
+directory together with an ``index.json`` mapping file name to page url, e.g.
+as written by ``python -m benchmarks.fixtures DIR``.
+"""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+from scrapy.http import HtmlResponse, Request
+
+CATEGORIES = ["headline", "entertainment", "international", "finance", "sports"]
+WORDS = "台北 記者 政府 市場 指數 今天 表示 公司 營收 發布 颱風 選舉 台積電 疫情 球隊".split()
+
+ARCHIVE_PAGE = """<!DOCTYPE html><html><head><title>蘋果新聞網</title></head>
+<body><div id="section-body"><div>{links}</div>
+<div><div></div><div><span>{date:%Y.%m.%d}</span></div></div></div></body></html>"""
+
+ARTICLE_PAGE = """<!DOCTYPE html><html><head><title>{title}</title>
+<meta property="og:image" content="https://img.appledaily.com.tw/images/{image}.jpg">
+<meta property="og:image:type" content="image/jpeg">
+{scripts}</head><body><nav>{nav}</nav>
+<div id="article-header"><header><div><h1><span>{title}</span></h1></div>
+<p><span>{subtitle}</span></p></header>
+<div><div>出版時間：<br>{published:%Y/%m/%d %H:%M}</div></div></div>
+<div id="article-body"><div id="articleBody"><section class="ad"><div id="ad-{id}">廣告</div>
+<script>window.ads.push("{id}")</script></section><section>{paragraphs}</section>
+</div></div><footer>{nav}</footer></body></html>"""
+
+
+def _sentence(rng, words=20):
+    return "".join(rng.choice(WORDS) for _ in range(words)) + "。"
+
+
+def article_page(index, date, paragraphs=12, seed=0):
+    rng = random.Random(f"{seed}-{date}-{index}")
+    body = []
+    for number in range(paragraphs):
+        text = " ".join(_sentence(rng) for _ in range(rng.randint(2, 5)))
+        if number == 0:
+            text = f"【記者{rng.choice(WORDS)}／台北報導】{text}"
+        if number == paragraphs - 1 and index % 4 == 0:
+            text += "（本文由中央社提供）"
+        body.append(
+            f'<p class="text--desktop" data-index="{number}"><strong>{text[:8]}'
+            f"</strong>{text[8:]}</p>"
+        )
+        if number % 4 == 2:
+            body.append(
+                '<figure><img src="data:image/gif;base64,R0lGODlhAQABAAAAACw="'
+                f' data-src="https://img.appledaily.com.tw/images/{index}-{number}.jpg">'
+                f"<figcaption>{_sentence(rng, 6)}</figcaption></figure>"
+            )
+    return ARTICLE_PAGE.format(
+        id=index,
+        title=_sentence(rng, 8),
+        subtitle=_sentence(rng, 10),
+        image=index % 50,
+        published=date.replace(hour=index % 24, minute=index % 60),
+        scripts="".join(f"<script>var s{n} = {n};</script>" for n in range(20)),
+        nav="".join(
+            f'<a href="/{category}/">{category}</a>' for category in CATEGORIES
+        ),
+        paragraphs="\n".join(body),
+    )
+
+
+def article_url(index, date):
+    category = CATEGORIES[index % len(CATEGORIES)]
+    return f"https://tw.appledaily.com/{category}/{date:%Y%m%d}/ID{index:06d}/"
+
+
+def archive_page(date, articles):
+    links = "".join(
+        f'<a href="{article_url(index, date)}">{index}</a>' for index in range(articles)
+    )
+    return ARCHIVE_PAGE.format(links=links, date=date)
+
+
+def archive_url(date):
+    return f"https://tw.appledaily.com/archive/{date:%Y%m%d}/"
+
+
+def synthetic_corpus(days=1, articles=200, paragraphs=12):
+    """Return {url: html} of archive and article pages."""
+    from datetime import datetime, timedelta
+
+    corpus = {}
+    for offset in range(days):
+        date = datetime(2020, 10, 12) - timedelta(days=offset)
+        corpus[archive_url(date)] = archive_page(date, articles)
+        for index in range(articles):
+            corpus[article_url(index, date)] = article_page(index, date, paragraphs)
+    return corpus
+
+
+def load_corpus(directory):
+    directory = Path(directory)
+    index = json.loads((directory / "index.json").read_text())
+    return {
+        url: (directory / file_name).read_text(encoding="utf-8")
+        for file_name, url in index.items()
+    }
+
+
+def save_corpus(corpus, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    index = {}
+    for number, (url, html) in enumerate(corpus.items()):
+        file_name = f"{number:06d}.html"
+        (directory / file_name).write_text(html, encoding="utf-8")
+        index[file_name] = url
+    (directory / "index.json").write_text(json.dumps(index, indent=2))
+
+
+def make_response(url, html):
+    return HtmlResponse(
+        url, body=html.encode("utf-8"), encoding="utf-8", request=Request(url)
+    )
+
+
+def is_article(url):
+    return "/archive/" not in url
+
+
+if __name__ == "__main__":
+    save_corpus(synthetic_corpus(), sys.argv[1])
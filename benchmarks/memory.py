@@ -0,0 +1,112 @@
+"""Peak RSS of a crawl of a local site stub as concurrency grows.
+
+python -m benchmarks.memory [--concurrency 16 64 128] [--articles 1000]
+
+Every concurrency level crawls the synthetic corpus in a fresh process (peak
+RSS only grows), served by a stub in this one. Article pages are large and
+images are sent whole even when only their size is needed, the worst case for
+memory. Per-stage growth of the peak RSS is read from the
+`memory/<stage>/peak_rss_bytes` stats.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.fixtures import synthetic_corpus
+from benchmarks.stubs import CorpusStub
+from parsers.metrics import peak_rss_bytes
+from parsers.spiders.appledaily import AppleDailySpider
+from parsers.spiders.archive import ArchiveSpider
+
+HOSTS = ["https://tw.appledaily.com", "https://img.appledaily.com.tw"]
+
+
+def crawl(settings, url, concurrency):
+    site = dataclasses.replace(
+        AppleDailySpider.site,
+        archive_url=f"{url}/archive/{{date}}/",
+        allowed_domains=[],
+    )
+    spider_class = type("StubSpider", (ArchiveSpider,), {"name": "stub", "site": site})
+
+    settings.set("LOG_LEVEL", "ERROR")
+    settings.set("ROBOTSTXT_OBEY", False)
+    settings.set("CONDITIONAL_CACHE_ENABLED", False)
+    settings.set("ENCLOSURE_CACHE_PATH", ":memory:")
+    settings.set("ADAPTIVE_CONCURRENCY_ENABLED", False)
+    settings.set("CONCURRENT_REQUESTS", concurrency)
+    settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", concurrency)
+    process = CrawlerProcess(settings, install_root_handler=False)
+    crawler = process.create_crawler(spider_class)
+    start = perf_counter()
+    process.crawl(crawler, date="20201012")
+    process.start()
+    elapsed = perf_counter() - start
+
+    stats = crawler.stats.get_stats()
+    return {
+        "items": stats.get("item_scraped_count", 0),
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_bytes() / 2**20,
+        "stages": {
+            key.split("/")[1]: value / 2**20
+            for key, value in stats.items()
+            if key.startswith("memory/") and key.count("/") == 2
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 128])
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--image-size", type=int, default=2 * 2**20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--url", help=argparse.SUPPRESS)  # Crawl the stub at url
+    args = parser.parse_args()
+
+    if args.url:
+        # Found from the current directory
+        settings = get_project_settings()
+        # Crawl output (feeds, archive, stores) goes to a throwaway directory
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            print(json.dumps(crawl(settings, args.url, args.concurrency[0])))
+        return
+
+    corpus = synthetic_corpus(articles=args.articles, paragraphs=args.paragraphs)
+    page_bytes = sum(len(html.encode()) for html in corpus.values()) / len(corpus)
+    print(f"{len(corpus)} pages of {page_bytes / 1024:.0f} KB on average")
+    print(f"{'concurrency':>12}{'items':>8}{'seconds':>10}{'peak RSS MB':>14}")
+    with CorpusStub(corpus, HOSTS, args.latency, args.image_size) as stub:
+        for concurrency in args.concurrency:
+            result = _crawl_in_process(stub.url, concurrency)
+            print(
+                f"{concurrency:>12}{result['items']:>8}{result['seconds']:>10.1f}"
+                f"{result['peak_rss_mb']:>14.1f}"
+            )
+            stages = sorted(result["stages"].items(), key=lambda item: -item[1])
+            for stage, growth in stages:
+                if growth >= 0.1:
+                    print(f"{'':>12}  {stage:<20}{growth:>8.1f} MB peak growth")
+
+
+def _crawl_in_process(url, concurrency):
+    command = [sys.executable, "-m", "benchmarks.memory", "--url", url]
+    command += ["--concurrency", str(concurrency)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Lookup latency of the near-duplicate index as it grows, and its accuracy.
+
+python -m benchmarks.near_duplicates [--sizes 10000 100000 300000]
+
+Texts are random characters with a Zipf distribution, like Chinese text
+(the fixture vocabulary is too small, every fixture article looks alike).
+Near duplicates are texts with a span replaced and a credit line appended.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+from array import array
+from time import perf_counter
+
+from parsers.stores import MinHashStore
+
+CHARACTERS = [chr(0x4E00 + index) for index in range(3000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(CHARACTERS))]
+
+
+def random_text(rng, length=1200):
+    return "".join(rng.choices(CHARACTERS, WEIGHTS, k=length))
+
+
+def edited(rng, text, fraction):
+    length = int(len(text) * fraction)
+    start = rng.randrange(len(text) - length)
+    edit = random_text(rng, length)
+    return f"{text[:start]}{edit}{text[start + length:]}（本文由中央社提供）"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--similarity", type=float, default=0.7)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    # Accuracy: edited copies should be found, unrelated texts not
+    store = MinHashStore(":memory:")
+    originals = [random_text(rng) for _ in range(args.pairs)]
+    for index, text in enumerate(originals):
+        store.set(f"original/{index}", MinHashStore.signature(text))
+    for fraction in (0.05, 0.1, 0.2, 0.3):
+        found = 0
+        for index, text in enumerate(originals):
+            signature = MinHashStore.signature(edited(rng, text, fraction))
+            match = store.find(signature, args.similarity)
+            found += match is not None and match[0] == f"original/{index}"
+        print(f"{fraction:4.0%} edited: {found / len(originals):6.1%} found")
+    false_positives = sum(
+        store.find(MinHashStore.signature(random_text(rng)), args.similarity)
+        is not None
+        for _ in range(args.pairs)
+    )
+    print(f"unrelated:   {false_positives / args.pairs:6.1%} found")
+    store.close()
+
+    # Latency: signatures of unrelated texts are close to random values
+    print(f"\n{'signatures':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        store = MinHashStore(os.path.join(directory, "minhashes.sqlite"))
+        size = 0
+        for target in sorted(args.sizes):
+            while size < target:
+                values = [rng.getrandbits(32) for _ in range(MinHashStore.SLOTS)]
+                store.set(f"random/{size}", array("I", values).tobytes())
+                size += 1
+            store.db.commit()
+            latencies = []
+            for text in originals:
+                signature = MinHashStore.signature(edited(rng, text, 0.1))
+                start = perf_counter()
+                store.find(signature, args.similarity)
+                latencies.append(perf_counter() - start)
+            latencies.sort()
+            print(
+                f"{size:>12}{statistics.median(latencies) * 1000:>10.3f}"
+                f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.3f}"
+            )
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
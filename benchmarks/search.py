@@ -0,0 +1,94 @@
+"""Indexing throughput and query latency of the full-text search index.
+
+python -m benchmarks.search [--articles 200000] [--paragraphs 4]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from benchmarks.fixtures import CATEGORIES, _sentence
+from parsers.items import Article, Category
+from parsers.stores import SearchIndex
+
+# (query, category), from words in every article to words in 0.1% of them, and
+# a category none of the matches is in, the slowest case
+QUERIES = [
+    ("台積電", None),
+    ("台積電 營收", None),
+    ("颱", None),
+    ("tsmc", None),
+    ("罕見7", None),
+    ("罕見7", "finance"),
+    ("關鍵字42", None),
+    ("關鍵字42 颱風", "international"),
+    ("不存在", None),
+]
+
+
+def synthetic_articles(count, paragraphs):
+    rng = random.Random(0)
+    start = datetime(2020, 10, 12, tzinfo=timezone.utc)
+    for index in range(count):
+        texts = [
+            " ".join(_sentence(rng) for _ in range(rng.randint(2, 5)))
+            for _ in range(paragraphs)
+        ]
+        # Rarer words, in 1% and 0.1% of the articles, and some Latin text
+        texts.append(f"罕見{index % 100} 關鍵字{index % 1000}")
+        if index % 10 == 0:
+            texts.append("TSMC 2020 Q3")
+        yield Article(
+            url=f"https://tw.appledaily.com/article/{index}/",
+            title=_sentence(rng, 8),
+            summary=texts[0],
+            context="\n".join(texts),
+            rich_context="",
+            category=[Category(name=CATEGORIES[index % len(CATEGORIES)])],
+            timestamp=start - timedelta(minutes=index),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=200000)
+    parser.add_argument("--paragraphs", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "search.sqlite")
+        index = SearchIndex(path)
+        start = perf_counter()
+        for article in synthetic_articles(args.articles, args.paragraphs):
+            index.add(article)
+        index.db.commit()
+        elapsed = perf_counter() - start
+        print(
+            f"{args.articles} articles indexed in {elapsed:.1f} s"
+            f" ({args.articles / elapsed:.0f} articles/s),"
+            f" {os.path.getsize(path) / 2**20:.0f} MB"
+        )
+
+        print(f"{'query':<24}{'hits':>6}{'p50 ms':>10}{'max ms':>10}")
+        for query, category in QUERIES:
+            latencies = []
+            for _ in range(args.rounds):
+                start = perf_counter()
+                hits = index.search(query, category, args.limit)
+                latencies.append(perf_counter() - start)
+            latencies.sort()
+            label = f"{query} [{category}]" if category else query
+            print(
+                f"{label:<24}{len(hits):>6}{latencies[len(latencies) // 2] * 1000:>10.2f}"
+                f"{latencies[-1] * 1000:>10.2f}"
+            )
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
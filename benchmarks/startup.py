@@ -0,0 +1,101 @@
+"""Import time of the project components a crawl loads, from `python -X importtime`.
+
+python -m benchmarks.startup [--rounds 10] [--top 15]
+
+Each round imports Scrapy alone, then Scrapy and the spider, pipelines,
+middlewares, extensions, download handlers and log formatter enabled in the
+project settings, each in a fresh interpreter. The difference is the startup
+cost of the project.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from scrapy.utils.misc import walk_modules
+from scrapy.utils.project import get_project_settings
+
+SCRAPY_MODULES = ["scrapy.crawler", "scrapy.exporters", "scrapy.commands"]
+# import time: self [us] | cumulative | <depth spaces>module
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def component_modules(settings):
+    paths = [settings["LOG_FORMATTER"]]
+    for name in ("ITEM_PIPELINES", "DOWNLOADER_MIDDLEWARES", "EXTENSIONS"):
+        paths.extend(
+            path for path, order in settings[name].items() if order is not None
+        )
+    paths.extend(settings.getdict("DOWNLOAD_HANDLERS").values())
+    modules = {path.rsplit(".", 1)[0] for path in paths if path}
+    # The spider loader imports every spider module
+    for package in settings.getlist("SPIDER_MODULES"):
+        modules.update(module.__name__ for module in walk_modules(package))
+    return sorted(module for module in modules if module.startswith("parsers"))
+
+
+def import_times(modules):
+    """Return {module: (self us, cumulative us)} of one fresh interpreter."""
+    code = "".join(f"import {module}\n" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        # Bytecode is cached, like after the first run of a deployment
+        env={
+            name: value
+            for name, value in os.environ.items()
+            if name != "PYTHONDONTWRITEBYTECODE"
+        },
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times[module] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return times
+
+
+def total_ms(times):
+    # Top level imports include everything they import
+    return (
+        sum(cumulative for _, cumulative, depth in times.values() if depth == 0) / 1000
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    modules = component_modules(get_project_settings())
+    print(f"components: {', '.join(modules)}")
+    import_times(SCRAPY_MODULES + modules)  # Writes the bytecode caches
+    scrapy_ms, project_ms = [], []
+    for _ in range(args.rounds):
+        scrapy_times = import_times(SCRAPY_MODULES)
+        times = import_times(SCRAPY_MODULES + modules)
+        scrapy_ms.append(total_ms(scrapy_times))
+        project_ms.append(total_ms(times) - total_ms(scrapy_times))
+
+    print(f"scrapy     {statistics.median(scrapy_ms):8.1f} ms (median)")
+    print(f"project    {statistics.median(project_ms):8.1f} ms (median, on top)")
+    # Heaviest modules only the project pulls in, from the last round
+    added = {
+        module: value for module, value in times.items() if module not in scrapy_times
+    }
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul. ms':>10}")
+    for module, (self_us, cumulative_us, _) in sorted(
+        added.items(), key=lambda item: -item[1][1]
+    )[: args.top]:
+        print(f"{module:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
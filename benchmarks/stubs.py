@@ -0,0 +1,200 @@
+"""Local HTTP stub servers used by the benchmarks."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+
+class StubServer:
+    """Serve `handler_class` from a background thread on a free local port."""
+
+    def __init__(self, handler_class):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+        self.server.stub = self
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CouchDBHandler(BaseHTTPRequestHandler):
+    """Minimal `_all_docs` / `_bulk_docs` with a fixed latency per request."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(stub.latency)
+        with stub.lock:
+            if self.path.endswith("/_all_docs"):
+                result = {"rows": [self._row(key) for key in body["keys"]]}
+            else:
+                result = [self._save(doc) for doc in body["docs"]]
+        data = json.dumps(result).encode()
+        self.send_response(200 if isinstance(result, dict) else 201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _row(self, key):
+        doc = self.server.stub.docs.get(key)
+        if doc is None:
+            return {"key": key, "error": "not_found"}
+        return {"id": key, "key": key, "value": {"rev": doc["_rev"]}}
+
+    def _save(self, doc):
+        docs = self.server.stub.docs
+        current = docs.get(doc["_id"])
+        if (current["_rev"] if current else None) != doc.get("_rev"):
+            return {"id": doc["_id"], "error": "conflict", "reason": "conflict"}
+        generation = int(current["_rev"].split("-")[0]) + 1 if current else 1
+        doc["_rev"] = f"{generation}-{uuid4().hex}"
+        docs[doc["_id"]] = doc
+        return {"ok": True, "id": doc["_id"], "rev": doc["_rev"]}
+
+
+class CouchDBStub(StubServer):
+    def __init__(self, latency=0.0):
+        super().__init__(CouchDBHandler)
+        self.latency = latency
+        self.docs = {}
+        self.lock = threading.Lock()
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Archive, article and image pages behind a latency and a rate limit.
+
+    /archive/<n> links to 20 articles, /article/<n>/<i> embeds one image
+    under /img/. Requests over the rate limit are answered with 429.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        if not stub.acquire():
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        # Latency grows with the number of requests being served at once
+        with stub.lock:
+            stub.active += 1
+            active = stub.active
+        time.sleep(stub.latency * (1 + max(active - stub.capacity, 0) / stub.capacity))
+        with stub.lock:
+            stub.active -= 1
+
+        parts = self.path.strip("/").split("/")
+        if parts[0] == "archive":
+            links = "".join(
+                f'<a href="/article/{parts[1]}/{i}">{i}</a>' for i in range(20)
+            )
+            body = f"<html><body>{links}</body></html>".encode()
+            content_type = "text/html"
+        elif parts[0] == "article":
+            image = f"/img/{parts[1]}/{parts[2]}.jpg"
+            body = f'<html><body><img src="{image}"><p>text</p></body></html>'.encode()
+            content_type = "text/html"
+        else:
+            body = b"\xff" * 1024
+            content_type = "image/jpeg"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SiteStub(StubServer):
+    def __init__(self, latency=0.05, rate_limit=None, capacity=8):
+        super().__init__(SiteHandler)
+        self.latency = latency
+        self.capacity = capacity  # Requests served without extra latency
+        self.rate_limit = rate_limit  # Requests per second, None for no limit
+        self.tokens = rate_limit or 0.0
+        self.refilled_at = time.monotonic()
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Token bucket holding at most one second of requests
+        if self.rate_limit is None:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.tokens + (now - self.refilled_at) * self.rate_limit,
+                self.rate_limit,
+            )
+            self.refilled_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CorpusHandler(BaseHTTPRequestHandler):
+    """Pages of a fixture corpus by path, with site urls pointing to the stub.
+
+    Images are ``image_size`` bytes. Like some image servers, HEAD is not
+    allowed and Range is ignored, the whole image is sent.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        stub = self.server.stub
+        time.sleep(stub.latency)
+        if self.path.startswith("/images/"):
+            body = b"\xff" * stub.image_size
+            content_type = "image/jpeg"
+        elif self.path in stub.pages:
+            body = stub.pages[self.path]
+            content_type = "text/html; charset=utf-8"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:  # Download stopped by the client
+            pass
+
+
+class CorpusStub(StubServer):
+    def __init__(self, corpus, hosts, latency=0.05, image_size=1024):
+        super().__init__(CorpusHandler)
+        self.latency = latency
+        self.image_size = image_size
+        # Path -> page, every link to one of `hosts` points to the stub
+        self.pages = {}
+        for url, html in corpus.items():
+            for host in hosts:
+                url = url.replace(host, "")
+                html = html.replace(host, self.url)
+            self.pages[url] = html.encode("utf-8")
@@ -0,0 +1,206 @@
+"""Offline benchmark of the crawl stages over recorded or synthetic pages.
+
+    python -m benchmarks.suite [--fixtures DIR] [--large] --output new.json
+    python -m benchmarks.suite --compare old.json new.json
+
+Each stage reports throughput, per-item latency percentiles and the peak RSS
+of the process after it ran. Results are saved as JSON so runs from two
+commits can be compared.
+"""
+
+import argparse
+import io
+import json
+import platform
+import subprocess
+from time import perf_counter
+
+from itemadapter import ItemAdapter
+from scrapy.utils.test import get_crawler
+
+from benchmarks.fixtures import is_article, load_corpus, make_response, synthetic_corpus
+from parsers.exporters import RSSExporter
+from parsers.items import Article
+from parsers.metrics import peak_rss_bytes
+from parsers.pipelines import SanitizePipeline
+from parsers.spiders.appledaily import AppleDailySpider
+
+
+def _peak_rss_mb():
+    return peak_rss_bytes() / (1024 * 1024)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[
+        min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    ]
+
+
+class Stages:
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, func, inputs):
+        """Call `func` once per input, return the outputs."""
+        outputs = []
+        latencies = []
+        start = perf_counter()
+        for value in inputs:
+            item_start = perf_counter()
+            outputs.append(func(value))
+            latencies.append(perf_counter() - item_start)
+        self._record(name, len(latencies), perf_counter() - start, latencies)
+        return outputs
+
+    def run_once(self, name, func, count):
+        """Call `func` once for a stage that handles `count` items in bulk."""
+        start = perf_counter()
+        output = func()
+        self._record(name, count, perf_counter() - start, [])
+        return output
+
+    def _record(self, name, count, seconds, latencies):
+        latencies.sort()
+        self.results[name] = {
+            "items": count,
+            "seconds": seconds,
+            "items_per_sec": count / seconds if seconds else None,
+            "p50_ms": _ms(_percentile(latencies, 0.50)),
+            "p95_ms": _ms(_percentile(latencies, 0.95)),
+            "p99_ms": _ms(_percentile(latencies, 0.99)),
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def run_benchmark(corpus):
+    crawler = get_crawler(AppleDailySpider, {"ENCLOSURE_CACHE_PATH": ":memory:"})
+    spider = AppleDailySpider.from_crawler(crawler)
+    stages = Stages()
+
+    archives = [
+        make_response(url, html) for url, html in corpus.items() if not is_article(url)
+    ]
+    articles = [
+        make_response(url, html) for url, html in corpus.items() if is_article(url)
+    ]
+
+    stages.run("parse", lambda response: list(spider.parse(response)), archives)
+    # parse_news yields the enclosure request, the article rides in cb_kwargs
+    requests = stages.run(
+        "parse_news", lambda response: next(spider.parse_news(response)), articles
+    )
+    items = [request.cb_kwargs["item"] for request in requests]
+
+    fields = [ItemAdapter(item).asdict() for item in items]
+    stages.run("article_from_dict", Article.from_dict, fields)
+    stages.run("article_validation", Article.validate, items)
+    sanitize = SanitizePipeline()
+    rich_context_bytes = sum(len(item.rich_context.encode()) for item in items)
+    stages.run("sanitize", lambda item: sanitize.process_item(item, spider), items)
+
+    output = io.BytesIO()
+    exporter = RSSExporter(output, spider.metadata, indent=2)
+    exporter.start_exporting()
+    stages.run("rss_export_item", exporter.export_item, items)
+    stages.run_once("rss_finish_exporting", exporter.finish_exporting, len(items))
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "corpus": {
+            "archive_pages": len(archives),
+            "article_pages": len(articles),
+            "article_bytes": sum(len(response.body) for response in articles),
+            "rich_context_bytes": rich_context_bytes,
+            "sanitized_rich_context_bytes": sum(
+                len(item.rich_context.encode()) for item in items
+            ),
+            "feed_bytes": len(output.getvalue()),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": stages.results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"commit {results['commit']}, corpus {results['corpus']}")
+    print(f"{'stage':<22}{'items/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stage in results["stages"].items():
+        print(
+            f"{name:<22}{_fmt(stage['items_per_sec'], 12, 1)}"
+            f"{_fmt(stage['p50_ms'], 10, 3)}{_fmt(stage['p95_ms'], 10, 3)}"
+            f"{_fmt(stage['p99_ms'], 10, 3)}"
+        )
+    print(f"peak RSS {results['peak_rss_mb']:.1f} MB")
+
+
+def print_comparison(old, new):
+    print(
+        f"{'stage':<22}{old['commit'] or 'old':>12}{new['commit'] or 'new':>12}{'speedup':>10}"
+    )
+    for name, stage in new["stages"].items():
+        before = old["stages"].get(name, {}).get("items_per_sec")
+        after = stage["items_per_sec"]
+        speedup = after / before if before and after else None
+        print(
+            f"{name:<22}{_fmt(before, 12, 1)}{_fmt(after, 12, 1)}{_fmt(speedup, 9, 2)}x"
+        )
+    print(f"peak RSS MB           {old['peak_rss_mb']:12.1f}{new['peak_rss_mb']:12.1f}")
+
+
+def _fmt(value, width, digits):
+    return f"{'-':>{width}}" if value is None else f"{value:{width}.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="directory of recorded pages")
+    parser.add_argument("--days", type=int, default=2)
+    parser.add_argument("--articles", type=int, default=300, help="per day")
+    parser.add_argument(
+        "--large", action="store_true", help="synthetic articles of 200 paragraphs"
+    )
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = (json.load(open(path)) for path in args.compare)
+        print_comparison(old, new)
+        return
+
+    if args.fixtures:
+        corpus = load_corpus(args.fixtures)
+    else:
+        corpus = synthetic_corpus(
+            days=args.days,
+            articles=args.articles,
+            paragraphs=200 if args.large else 12,
+        )
+    results = run_benchmark(corpus)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Crawl time and 429s against a local site stub, fixed vs adaptive concurrency.
+
+python -m benchmarks.throttling --archives 10 --latency 0.05 --rate-limit 100
+"""
+
+import argparse
+from time import perf_counter
+
+import scrapy
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer, reactor
+
+from benchmarks.stubs import SiteStub
+
+# Stub urls have the same three kinds of requests as the site
+STUB_SLOTS = {
+    "image": {
+        "pattern": r"/img/",
+        "start_concurrency": 8,
+        "max_concurrency": 32,
+        "target_latency": 0.5,
+    },
+    "archive": {
+        "pattern": r"/archive/",
+        "start_concurrency": 1,
+        "max_concurrency": 2,
+        "target_latency": 1.0,
+    },
+    "article": {
+        "pattern": r"",
+        "start_concurrency": 4,
+        "max_concurrency": 16,
+        "target_latency": 0.5,
+    },
+}
+
+
+class StubSpider(scrapy.Spider):
+    name = "stub"
+
+    def __init__(self, url, archives, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.start_urls = [f"{url}/archive/{n}" for n in range(archives)]
+
+    def parse(self, response):
+        yield from response.follow_all(css="a", callback=self.parse_article)
+
+    def parse_article(self, response):
+        yield response.follow(response.css("img::attr(src)").get(), self.parse_image)
+
+    def parse_image(self, response):
+        yield {"url": response.url}
+
+
+@defer.inlineCallbacks
+def bench(url, archives, adaptive, concurrency):
+    settings = get_project_settings()
+    settings.set("ITEM_PIPELINES", {})
+    settings.set("ROBOTSTXT_OBEY", False)
+    settings.set("CONDITIONAL_CACHE_ENABLED", False)
+    settings.set("LOG_LEVEL", "ERROR")
+    settings.set("RETRY_TIMES", 10)
+    settings.set("CONCURRENT_REQUESTS", 64)
+    settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", concurrency)
+    settings.set("ADAPTIVE_CONCURRENCY_ENABLED", adaptive)
+    settings.set("ADAPTIVE_CONCURRENCY_SLOTS", STUB_SLOTS)
+    runner = CrawlerRunner(settings)
+    crawler = runner.create_crawler(StubSpider)
+    start = perf_counter()
+    yield runner.crawl(crawler, url=url, archives=archives)
+    elapsed = perf_counter() - start
+    stats = crawler.stats.get_stats()
+    return elapsed, stats
+
+
+@defer.inlineCallbacks
+def main(args):
+    with SiteStub(args.latency, args.rate_limit, args.capacity) as stub:
+        for name, adaptive, concurrency in (
+            ("fixed 8", False, 8),
+            ("fixed 32", False, 32),
+            ("adaptive", True, 8),
+        ):
+            elapsed, stats = yield bench(stub.url, args.archives, adaptive, concurrency)
+            items = stats.get("item_scraped_count", 0)
+            print(
+                f"{name:<10} {items / elapsed:8.1f} items/s"
+                f"  {stats.get('downloader/response_status_count/429', 0):5d} x 429"
+                f"  {items:5d} items"
+            )
+            for key, value in sorted(stats.items()):
+                if key.startswith("adaptive/"):
+                    print(f"    {key} = {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--archives", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--capacity", type=int, default=8)
+    args = parser.parse_args()
+    d = main(args)
+    d.addErrback(lambda failure: failure.printTraceback())
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
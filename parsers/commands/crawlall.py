@@ -0,0 +1,36 @@
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+
+from parsers.spiders.archive import ArchiveSpider
+
+
+def archive_spider_names(spider_loader):
+    return [
+        name
+        for name in sorted(spider_loader.list())
+        if issubclass(spider_loader.load(name), ArchiveSpider)
+    ]
+
+
+class Command(BaseRunSpiderCommand):
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [spider ...]"
+
+    def short_desc(self):
+        return "Run several site spiders (default: all) in one process"
+
+    def run(self, args, opts):
+        names = args or archive_spider_names(self.crawler_process.spider_loader)
+        if not names:
+            raise UsageError("No spider to run")
+
+        # Crawlers share the reactor, its DNS cache and thread pool, each has
+        # its own downloader slots and pipelines, so feeds stay per site
+        for name in names:
+            self.crawler_process.crawl(name, **opts.spargs)
+        self.crawler_process.start()
+        if self.crawler_process.bootstrap_failed:
+            self.exitcode = 1
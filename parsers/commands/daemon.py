@@ -0,0 +1,98 @@
+import json
+import logging
+from time import monotonic
+
+from scrapy.commands import BaseRunSpiderCommand
+from scrapy.exceptions import UsageError
+from scrapy.utils.log import failure_to_exc_info
+from twisted.internet import defer, task
+
+from parsers.commands.crawlall import archive_spider_names
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseRunSpiderCommand):
+
+    requires_project = True
+
+    def syntax(self):
+        return "[options] [spider ...]"
+
+    def short_desc(self):
+        return "Re-run site spiders (default: all) on an interval in one process"
+
+    def add_options(self, parser):
+        BaseRunSpiderCommand.add_options(self, parser)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="seconds between the starts of two runs (default: DAEMON_INTERVAL)",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=0, help="stop after this many runs"
+        )
+
+    def run(self, args, opts):
+        names = args or archive_spider_names(self.crawler_process.spider_loader)
+        if not names:
+            raise UsageError("No spider to run")
+        interval = opts.interval
+        if interval is None:
+            interval = self.settings.getfloat("DAEMON_INTERVAL")
+
+        d = self._run_forever(names, opts.spargs, interval, opts.runs)
+        d.addErrback(
+            lambda failure: logger.error(
+                "Daemon stopped", exc_info=failure_to_exc_info(failure)
+            )
+        )
+        d.addBoth(self._stop)
+        self.crawler_process.start(stop_after_crawl=False)
+
+    def _stop(self, _):
+        from twisted.internet import reactor
+
+        if reactor.running:
+            reactor.stop()
+
+    @defer.inlineCallbacks
+    def _run_forever(self, names, spargs, interval, runs):
+        from twisted.internet import reactor
+
+        run = 0
+        while not runs or run < runs:
+            run += 1
+            started = monotonic()
+            # Crawlers are single use, the process' DNS cache, connection pool
+            # and robots.txt cache outlive them
+            crawlers = [self.crawler_process.create_crawler(name) for name in names]
+            yield defer.DeferredList(
+                [self.crawler_process.crawl(crawler, **spargs) for crawler in crawlers]
+            )
+            elapsed = monotonic() - started
+            self._report(run, elapsed, crawlers)
+            if not runs or run < runs:
+                yield task.deferLater(reactor, max(interval - elapsed, 0), lambda: None)
+
+    def _report(self, run, elapsed, crawlers):
+        spiders = {
+            crawler.spidercls.name: {
+                "seconds": crawler.stats.get_value("elapsed_time_seconds"),
+                "items": crawler.stats.get_value("item_scraped_count", 0),
+                "requests": crawler.stats.get_value("downloader/request_count", 0),
+            }
+            for crawler in crawlers
+        }
+        logger.info(
+            f"Run {run} finished in {elapsed:.2f}s: "
+            + ", ".join(
+                f"{name} {stats['items']} items in {stats['seconds']}s"
+                for name, stats in spiders.items()
+            )
+        )
+        report_path = self.settings.get("DAEMON_REPORT_PATH")
+        if report_path:
+            with open(report_path, "a", encoding="utf-8") as file:
+                record = {"run": run, "seconds": round(elapsed, 3), "spiders": spiders}
+                file.write(json.dumps(record) + "\n")
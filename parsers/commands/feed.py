@@ -0,0 +1,75 @@
+import os
+from datetime import datetime
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from parsers.exporters import FEED_FORMATS, open_feed_file
+from parsers.stores import ArchiveStore
+
+
+class Command(ScrapyCommand):
+
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[options] <spider>"
+
+    def short_desc(self):
+        return "Generate a feed from the article archive"
+
+    def add_options(self, parser):
+        ScrapyCommand.add_options(self, parser)
+        parser.add_argument("--start", help="first date, in %%Y%%m%%d")
+        parser.add_argument("--end", help="last date, in %%Y%%m%%d")
+        parser.add_argument("--category", help="category name, e.g. 財經")
+        parser.add_argument("--limit", type=int, help="at most this many items")
+        parser.add_argument(
+            "--format",
+            default="xml",
+            help=f"output suffix: {', '.join(FEED_FORMATS)}, may end in .gz/.br",
+        )
+        parser.add_argument(
+            "-o", "--output", help="output file (default: <spider>_archive.<format>)"
+        )
+
+    def run(self, args, opts):
+        if len(args) != 1:
+            raise UsageError()
+        format_name = opts.format.removesuffix(".gz").removesuffix(".br")
+        if format_name not in FEED_FORMATS:
+            raise UsageError(f"Unknown feed format: {opts.format}")
+        try:
+            start, end = (
+                datetime.strptime(date, "%Y%m%d").date() if date else None
+                for date in (opts.start, opts.end)
+            )
+        except ValueError as e:
+            raise UsageError(str(e))
+
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        output = opts.output or f"{spidercls.name}_archive.{opts.format}"
+        exporter_class, options = FEED_FORMATS[format_name]
+        path = os.path.join(self.settings.get("ARCHIVE_PATH"), spidercls.name)
+        if not os.path.exists(os.path.join(path, "index.sqlite")):
+            raise UsageError(f"No archive in {path}, crawl with ARCHIVE_ENABLED")
+        store = ArchiveStore(path)
+        file = open_feed_file(output)
+        try:
+            # Archive answers newest first, no need to spool
+            exporter = exporter_class(
+                file,
+                spidercls.metadata,
+                indent=2,
+                source_feeds=spidercls.site.source_feeds,
+                **options,
+            )
+            exporter.start_exporting()
+            for item in store.query(start, end, opts.category, opts.limit):
+                exporter.write_item(item)
+            exporter.write_footer()
+        finally:
+            file.close()
+            store.close()
+        os.replace(f"{output}.tmp", output)
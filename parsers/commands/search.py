@@ -0,0 +1,75 @@
+import os
+import sys
+
+from scrapy.commands import ScrapyCommand
+from scrapy.exceptions import UsageError
+
+from parsers.exporters import FEED_FORMATS, open_feed_file
+from parsers.stores import ArchiveStore, SearchIndex
+
+
+class Command(ScrapyCommand):
+
+    requires_project = True
+    default_settings = {"LOG_ENABLED": False}
+
+    def syntax(self):
+        return "[options] <spider> <word> [<word> ...]"
+
+    def short_desc(self):
+        return "Generate a feed of the archived articles matching all words"
+
+    def add_options(self, parser):
+        ScrapyCommand.add_options(self, parser)
+        parser.add_argument("--category", help="category name, e.g. 財經")
+        parser.add_argument(
+            "--limit", type=int, default=20, help="at most this many items"
+        )
+        parser.add_argument(
+            "--format",
+            default="xml",
+            help=f"output suffix: {', '.join(FEED_FORMATS)}, may end in .gz/.br",
+        )
+        parser.add_argument("-o", "--output", help="output file (default: stdout)")
+
+    def run(self, args, opts):
+        if len(args) < 2:
+            raise UsageError()
+        format_name = opts.format.removesuffix(".gz").removesuffix(".br")
+        if format_name not in FEED_FORMATS:
+            raise UsageError(f"Unknown feed format: {opts.format}")
+        if opts.output is None and format_name != opts.format:
+            raise UsageError("Compressed feeds need an output file")
+
+        spidercls = self.crawler_process.spider_loader.load(args[0])
+        path = os.path.join(self.settings.get("ARCHIVE_PATH"), spidercls.name)
+        if not os.path.exists(os.path.join(path, "search.sqlite")):
+            raise UsageError(f"No search index in {path}, crawl with SEARCH_ENABLED")
+        index = SearchIndex(os.path.join(path, "search.sqlite"))
+        store = ArchiveStore(path)
+        try:
+            guids = index.search(" ".join(args[1:]), opts.category, opts.limit)
+            # Newest first already, no need to spool
+            items = filter(None, map(store.get, guids))
+            exporter_class, options = FEED_FORMATS[format_name]
+            file = open_feed_file(opts.output) if opts.output else sys.stdout.buffer
+            try:
+                exporter = exporter_class(
+                    file,
+                    spidercls.metadata,
+                    indent=2,
+                    source_feeds=spidercls.site.source_feeds,
+                    **options,
+                )
+                exporter.start_exporting()
+                for item in items:
+                    exporter.write_item(item)
+                exporter.write_footer()
+            finally:
+                if opts.output:
+                    file.close()
+        finally:
+            index.close()
+            store.close()
+        if opts.output:
+            os.replace(f"{opts.output}.tmp", opts.output)
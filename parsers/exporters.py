@@ -1,10 +1,25 @@
-from datetime import datetime
-from email.utils import format_datetime
-from uuid import uuid4
-from xml.sax.saxutils import escape
-
-from scrapy.exporters import PythonItemExporter, XmlItemExporter
-from scrapy.utils.python import is_listlike
+import gzip
+import heapq
+import importlib.util
+import json
+import logging
+import os
+import pickle
+import sys
+from dataclasses import asdict, fields
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from itertools import islice, takewhile
+from tempfile import TemporaryFile
+from time import monotonic
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape, quoteattr
+
+from scrapy.exporters import BaseItemExporter, PythonItemExporter
+
+from parsers.items import Article, Author, Category, Image
+
+logger = logging.getLogger(__name__)
 
 VALID_RSS_ELEMENTS = {
     "channel": [
@@ -50,13 +65,29 @@ VALID_RSS_ELEMENTS = {
     },
 }
 
-# FIXME: guid isPermaLink attributes
+# Article field -> RSS item elements, other fields keep their own name
+ITEM_TO_RSS_MAPPING = {
+    "url": ["link", "guid"],
+    "rich_context": ["description"],
+    "image": ["enclosure"],
+    "timestamp": ["pubDate"],
+    "third_party": ["source"],
+}
+
+# Slim feed: summary as description, without the article HTML
+SLIM_ITEM_TO_RSS_MAPPING = {
+    **ITEM_TO_RSS_MAPPING,
+    "summary": ["description"],
+    "rich_context": [],
+}
+
+# guid is the article url, marked with isPermaLink
 # https://www.w3schools.com/xml/rss_tag_guid.asp
 
-# FIXME: source url attributes
+# source is only written for syndicated articles, with the required url
 # https://www.w3schools.com/xml/rss_tag_source.asp
 
-# FIXME: Add support for enclosure
+# enclosure always has the required url, length and type attributes
 # https://www.w3schools.com/xml/rss_tag_enclosure.asp
 
 
@@ -72,148 +103,673 @@ def _clean_item_field(value):
     return value
 
 
-class RSSExporter(XmlItemExporter):
-    def __init__(self, file, channel_meta, **kwargs):
+def _rss_item_fields(mapping):
+    # [(RSS element, Article field)], resolved once per exporter
+    names = [field.name for field in fields(Article)]
+    return [
+        (name, name)
+        for name in names
+        if name not in mapping and name in VALID_RSS_ELEMENTS["item"]
+    ] + [
+        (rss_name, name)
+        for name in names
+        if name in mapping
+        for rss_name in mapping[name]
+        if rss_name in VALID_RSS_ELEMENTS["item"]
+    ]
+
+
+def _parse_item_element(element):
+    # Rebuild the article fields `RSSExporter._write_item` reads
+    def text(tag):
+        child = element.find(tag)
+        return child.text if child is not None and child.text else None
+
+    pub_date = text("pubDate")
+    if pub_date is not None:
+        pub_date = parsedate_to_datetime(pub_date)
+        if pub_date.tzinfo is None:
+            pub_date = pub_date.replace(tzinfo=timezone.utc)
+
+    enclosure = element.find("enclosure")
+    category = text("category")
+    return Article(
+        url=text("guid") or text("link"),
+        title=text("title"),
+        summary="",
+        context="",
+        rich_context=text("description"),
+        author=[
+            Author(id=value.findtext("id", ""), name=value.findtext("name", ""))
+            for value in element.iterfind("author/value")
+        ],
+        image=Image(**enclosure.attrib) if enclosure is not None else None,
+        category=[Category(name=category)] if category else [],
+        timestamp=pub_date,
+        third_party=text("source"),
+    )
+
+
+def read_rss_items(file):
+    """Yield articles of an RSS feed written by `RSSExporter`, in feed order."""
+    for _, element in iterparse(file):
+        if element.tag == "item":
+            yield _parse_item_element(element)
+            element.clear()
+
+
+def read_item_records(file):
+    """Yield articles written by `ItemRecordExporter`, in feed order."""
+    for line in file:
+        data = json.loads(line)
+        for name in ("timestamp", "updated_at"):
+            if data[name] is not None:
+                data[name] = datetime.fromisoformat(data[name])
+        yield Article.from_dict(data)
+
+
+class ItemSpool:
+    """Keep items sorted without holding all of them in memory.
+
+    Items are buffered until ``buffer_size`` items, or ``buffer_bytes``
+    bytes as measured by ``sizeof``, are reached, then sorted and spilled to
+    a temporary file as a run. Iterating merges the runs back with a k-way
+    merge, so only one item per run stays in memory.
+    """
+
+    def __init__(
+        self, key, reverse=False, buffer_size=1000, buffer_bytes=None, sizeof=None
+    ):
+        self.key = key
+        self.reverse = reverse
+        self.buffer_size = buffer_size
+        self.buffer_bytes = buffer_bytes
+        self.sizeof = sizeof
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.runs = []
+
+    def append(self, item):
+        self.buffer.append(item)
+        if self.buffer_bytes is not None:
+            self.buffered_bytes += self.sizeof(item)
+        if len(self.buffer) >= self.buffer_size or (
+            self.buffer_bytes is not None and self.buffered_bytes >= self.buffer_bytes
+        ):
+            self._spill()
+
+    def _spill(self):
+        self.buffer.sort(key=self.key, reverse=self.reverse)
+        run = TemporaryFile()
+        for item in self.buffer:
+            pickle.dump(item, run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+        self.buffered_bytes = 0
+
+    @staticmethod
+    def _read_run(run):
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+    def __iter__(self):
+        # Runs before buffer, so items with equal keys keep insertion order
+        self.buffer.sort(key=self.key, reverse=self.reverse)
+        runs = [self._read_run(run) for run in self.runs]
+        return heapq.merge(*runs, self.buffer, key=self.key, reverse=self.reverse)
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.buffer = []
+
+
+class ItemJournal:
+    """Append-only file of ``(key, item)`` records, read back on restart.
+
+    Every record is flushed when appended, so it survives the crawl process
+    being killed (not the machine losing power). A record cut short by a
+    crash is discarded when the journal is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a+b")
+
+    def append(self, key, item):
+        pickle.dump((key, item), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.flush()
+
+    def __iter__(self):
+        self.file.seek(0)
+        while True:
+            offset = self.file.tell()
+            try:
+                yield pickle.load(self.file)
+            except (EOFError, pickle.UnpicklingError):
+                break
+        if offset < os.fstat(self.file.fileno()).st_size:
+            logger.warning(f"Discarded truncated record at {offset} of {self.path}")
+            self.file.truncate(offset)
+
+    def close(self):
+        self.file.close()
+
+
+def _cdata(value):
+    # "]]>" would end the section early, split it over two sections
+    return "<![CDATA[" + value.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+
+# Sort key of feed items, undated articles go last
+_UNDATED = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _published(item):
+    return item.timestamp or _UNDATED
+
+
+def _item_size(item):
+    # Memory of the text fields, the bulk of an article
+    return sum(
+        sys.getsizeof(value)
+        for value in (item.title, item.summary, item.context, item.rich_context)
+    )
+
+
+class FeedItems:
+    """Items of one feed, newest first.
+
+    New items are merged with items of the previous feed, which are dropped
+    if re-exported, and cut to ``max_items`` / ``max_age``. Shared by every
+    exporter writing the same feed, so items are sorted only once.
+    """
+
+    def __init__(
+        self, buffer_size=1000, max_items=None, max_age=None, buffer_bytes=None
+    ):
+        self.max_items = max_items
+        self.max_age = max_age
+        spool_options = dict(
+            key=_published,
+            reverse=True,
+            buffer_size=buffer_size,
+            buffer_bytes=buffer_bytes,
+            sizeof=_item_size,
+        )
+        self.item_spool = ItemSpool(**spool_options)
+        self.previous_spool = ItemSpool(**spool_options)
+        self.exported_guids = set()
+
+    def append(self, item):
+        self.exported_guids.add(item.url)
+        self.item_spool.append(item)
+
+    def merge_previous(self, item):
+        self.previous_spool.append(item)
+
+    def __iter__(self):
+        previous_items = (
+            item for item in self.previous_spool if item.url not in self.exported_guids
+        )
+        items = heapq.merge(
+            self.item_spool,
+            previous_items,
+            key=_published,
+            reverse=True,
+        )
+        if self.max_age:
+            oldest = datetime.now(timezone.utc) - self.max_age
+            items = takewhile(lambda x: _published(x) >= oldest, items)
+        return islice(items, self.max_items)
+
+    def close(self):
+        self.item_spool.close()
+        self.previous_spool.close()
+
+
+class FeedExporter(BaseItemExporter):
+    """Base of the feed exporters.
+
+    Items are spooled by `export_item` and written by `finish_exporting`
+    once sorted. Subclasses render strings with `write_item` and
+    `write_footer`, output is encoded and written to the file in large
+    chunks.
+    """
+
+    def __init__(
+        self,
+        file,
+        channel_meta,
+        buffer_size=1000,
+        max_items=None,
+        max_age=None,
+        buffer_bytes=None,
+        items=None,
+        write_buffer_size=64 * 1024,
+        **kwargs,
+    ):
+        super().__init__(dont_fail=True, **kwargs)
+        if not self.encoding:
+            self.encoding = "utf-8"
         self.file = file
         self.channel_meta = channel_meta
-        self.item_list = []
-        super().__init__(file, root_element="channel", **kwargs)
+        if items is None:
+            items = FeedItems(buffer_size, max_items, max_age, buffer_bytes)
+        self.items = items
+        self.write_buffer = []
+        self.write_buffer_length = 0
+        self.write_buffer_size = write_buffer_size
+
+        # Indentation of each depth, and line break, as with XmlItemExporter
+        self.newline = "\n" if self.indent is not None else ""
+        self.padding = [" " * (self.indent or 0) * depth for depth in range(6)]
+
+    def export_item(self, item):
+        # Didn't actually write to file, spool and write after sorting
+        self.items.append(item)
+
+    def merge_previous_item(self, item):
+        # Item from an earlier feed, dropped if re-exported in this run
+        self.items.merge_previous(item)
+
+    def finish_exporting(self):
+        for item in self.items:
+            self.write_item(item)
+        self.items.close()
+        self.write_footer()
+
+    def write_item(self, item):
+        raise NotImplementedError
+
+    def write_footer(self):
+        raise NotImplementedError
+
+    def _write(self, text):
+        self.write_buffer.append(text)
+        self.write_buffer_length += len(text)
+        if self.write_buffer_length >= self.write_buffer_size:
+            self._flush()
+
+    def _flush(self):
+        self.file.write("".join(self.write_buffer).encode(self.encoding))
+        self.write_buffer = []
+        self.write_buffer_length = 0
+
+
+class RSSExporter(FeedExporter):
+    """Write articles as an RSS 2.0 feed.
+
+    Items are rendered to strings from templates built once per exporter.
+    """
+
+    def __init__(
+        self,
+        file,
+        channel_meta,
+        field_mapping=ITEM_TO_RSS_MAPPING,
+        source_feeds=None,
+        **kwargs,
+    ):
+        super().__init__(file, channel_meta, **kwargs)
+        self.item_fields = _rss_item_fields(field_mapping)
+        # Third party name -> url of its RSS feed, the url <source> requires
+        self.source_feeds = source_feeds or {}
+        pad = self.padding
+        self.element_template = pad[3] + "<{0}>{1}</{0}>" + self.newline
+        self.item_start = pad[2] + "<item>" + self.newline
+        self.item_end = pad[2] + "</item>" + self.newline
 
     def start_exporting(self):
-        self.xg.startDocument()
-        # rss tag
-        self.xg.startElement("rss", {"version": "2.0"})
-        self._beautify_newline(new_item=True)
-        # channel tag
-        self._beautify_indent(depth=1)
-        self.xg.startElement(self.root_element, {})
-        self._beautify_newline(new_item=True)
+        pad, newline = self.padding, self.newline
+        self._write(f'<?xml version="1.0" encoding="{self.encoding}"?>\n')
+        self._write(f'<rss version="2.0">{newline}{pad[1]}<channel>{newline}')
 
         # Inject channel metadata
         for field, value in self.channel_meta.items():
             if field not in VALID_RSS_ELEMENTS["channel"]:
                 continue
             if field == "image":
-                image_value = {}
+                self._write(f"{pad[2]}<image>{newline}")
                 for image_field in VALID_RSS_ELEMENTS["channel_image"]:
-                    field_value = getattr(self.channel_meta["image"], image_field, None)
+                    field_value = getattr(value, image_field, None)
                     if field_value:
-                        image_value[image_field] = field_value
-                value = image_value
-            self._export_xml_field(field, value, depth=2)
+                        self._write(
+                            f"{pad[3]}<{image_field}>{escape(str(field_value))}"
+                            f"</{image_field}>{newline}"
+                        )
+                self._write(f"{pad[2]}</image>{newline}")
+            else:
+                self._write(f"{pad[2]}<{field}>{escape(str(value))}</{field}>{newline}")
 
-    def export_item(self, item):
-        # Didn't actually write to file, store to list and write after sorting
-        self.item_list.append(item)
+    def write_item(self, item):
+        pad, newline = self.padding, self.newline
+        parts = [self.item_start]
+        for name, field_name in self.item_fields:
+            value = getattr(item, field_name)
 
-    def _write_item(self, item):
-        # Edit from `export_item` from `scrapy.exporters.XmlItemExporter`
+            if name == "enclosure":
+                # url, length and type are all required
+                if value is not None:
+                    parts.append(
+                        f"{pad[3]}<enclosure url={quoteattr(value.url)}"
+                        f" length={quoteattr(str(value.length or 0))}"
+                        f" type={quoteattr(value.type or '')} />{newline}"
+                    )
+            elif name == "source":
+                # url of the source's feed is required, left out when unknown
+                source_feed = value and self.source_feeds.get(value)
+                if source_feed:
+                    parts.append(
+                        f"{pad[3]}<source url={quoteattr(source_feed)}>"
+                        f"{_cdata(value)}</source>{newline}"
+                    )
+            elif name == "guid":
+                parts.append(
+                    f'{pad[3]}<guid isPermaLink="true">{escape(value)}</guid>{newline}'
+                )
+            elif name == "author":
+                parts.append(f"{pad[3]}<author>{newline}")
+                for author in value:
+                    parts.append(
+                        f"{pad[4]}<value>{newline}"
+                        f"{pad[5]}<id>{_cdata(str(author.id))}</id>{newline}"
+                        f"{pad[5]}<name>{_cdata(author.name)}</name>{newline}"
+                        f"{pad[4]}</value>{newline}"
+                    )
+                parts.append(f"{pad[3]}</author>{newline}")
+            else:
+                if name == "category":
+                    value = value[0].name if value else None
+                value = _clean_item_field(value)
+                if value and VALID_RSS_ELEMENTS["item"][name]:
+                    value = _cdata(str(value))
+                elif value:
+                    value = escape(str(value))
+                parts.append(self.element_template.format(name, value))
+        parts.append(self.item_end)
+        self._write("".join(parts))
 
-        self._beautify_indent(depth=2)
-        self.xg.startElement(self.item_element, {})
-        self._beautify_newline()
+    def write_footer(self):
+        self._write(f"{self.padding[1]}</channel>{self.newline}</rss>")
+        self._flush()
 
-        for name, value in self._get_serialized_fields(item, default_value=""):
-            if name not in VALID_RSS_ELEMENTS["item"]:
-                continue
 
-            # Special handler for image
-            if name == "enclosure":
-                value = {k: v for k, v in value.items() if v is not None}
-                self._export_xml_field(name, None, depth=3, attributes=value)
-                continue
+class AtomExporter(FeedExporter):
+    """Write articles as an Atom 1.0 feed."""
 
-            # Special handler for category
-            if name == "category":
-                value = value[0]["name"]
+    def start_exporting(self):
+        pad, newline = self.padding, self.newline
+        meta = self.channel_meta
+        # Atom requires a timestamp on every entry, undated ones use the feed's
+        self.updated = datetime.now(timezone.utc).isoformat()
+        self._write(f'<?xml version="1.0" encoding="{self.encoding}"?>\n')
+        self._write(f'<feed xmlns="http://www.w3.org/2005/Atom">{newline}')
+        for element, value in (
+            ("id", meta.get("link")),
+            ("title", meta.get("title")),
+            ("subtitle", meta.get("description")),
+            ("rights", meta.get("copyright")),
+            ("logo", getattr(meta.get("image"), "url", None)),
+            ("updated", self.updated),
+        ):
+            if value:
+                self._write(f"{pad[1]}<{element}>{escape(value)}</{element}>{newline}")
+        if meta.get("link"):
+            self._write(f"{pad[1]}<link href={quoteattr(meta['link'])} />{newline}")
+
+    def write_item(self, item):
+        pad, newline = self.padding, self.newline
+        published = item.timestamp.isoformat() if item.timestamp else self.updated
+        updated = item.updated_at.isoformat() if item.updated_at else published
+        parts = [
+            f"{pad[1]}<entry>{newline}",
+            f"{pad[2]}<id>{escape(item.url)}</id>{newline}",
+            f"{pad[2]}<title>{escape(item.title or '')}</title>{newline}",
+            f"{pad[2]}<link href={quoteattr(item.url)} />{newline}",
+            f"{pad[2]}<published>{published}</published>{newline}",
+            f"{pad[2]}<updated>{updated}</updated>{newline}",
+        ]
+        for author in item.author:
+            parts.append(
+                f"{pad[2]}<author><name>{escape(author.name)}</name></author>{newline}"
+            )
+        for category in item.category:
+            parts.append(
+                f"{pad[2]}<category term={quoteattr(category.name)} />{newline}"
+            )
+        if item.image is not None:
+            parts.append(
+                f'{pad[2]}<link rel="enclosure" href={quoteattr(item.image.url)}'
+                f" type={quoteattr(item.image.type or '')}"
+                f" length={quoteattr(str(item.image.length or 0))} />{newline}"
+            )
+        if item.summary:
+            parts.append(f"{pad[2]}<summary>{escape(item.summary)}</summary>{newline}")
+        if item.rich_context:
+            parts.append(
+                f'{pad[2]}<content type="html">{_cdata(item.rich_context)}</content>'
+                f"{newline}"
+            )
+        parts.append(f"{pad[1]}</entry>{newline}")
+        self._write("".join(parts))
 
-            # Cleanup data
-            value = _clean_item_field(value)
+    def write_footer(self):
+        self._write("</feed>")
+        self._flush()
 
-            # Write to xml
-            self._export_xml_field(
-                name,
-                value,
-                depth=3,
-                escape_content=VALID_RSS_ELEMENTS["item"][name],
-            )
 
-        self._beautify_indent(depth=2)
-        self.xg.endElement(self.item_element)
-        self._beautify_newline(new_item=True)
+class JSONFeedExporter(FeedExporter):
+    """Write articles as a JSON Feed 1.1."""
 
-    def finish_exporting(self):
-        # Sort and write items
-        self.item_list.sort(key=lambda x: x["pubDate"], reverse=True)
-        for item in self.item_list:
-            self._write_item(item)
-
-        # channel tag
-        self._beautify_indent(depth=1)
-        self.xg.endElement(self.root_element)
-        self._beautify_newline(new_item=True)
-
-        # rss tag
-        self.xg.endElement("rss")
-        self.xg.endDocument()
-
-    def _export_xml_field(
-        self, name, serialized_value, depth, attributes=None, escape_content=False
-    ):
-        if attributes is None:
-            attributes = {}
-        self._beautify_indent(depth=depth)
-        self.xg.startElement(name, attributes)
-        if hasattr(serialized_value, "items"):
-            self._beautify_newline()
-            for subname, value in serialized_value.items():
-                self._export_xml_field(
-                    subname, value, depth=depth + 1, escape_content=escape_content
-                )
-            self._beautify_indent(depth=depth)
-        elif is_listlike(serialized_value):
-            self._beautify_newline()
-            for value in serialized_value:
-                self._export_xml_field(
-                    "value", value, depth=depth + 1, escape_content=escape_content
-                )
-            self._beautify_indent(depth=depth)
-        elif serialized_value:  # Make sure content is not empty
-            content = str(serialized_value)
-            if escape_content:
-                self._xg_raw_characters(f"<![CDATA[{content}]]>")
-            else:
-                self._xg_raw_characters(escape(content))
-        self.xg.endElement(name)
-        self._beautify_newline()
+    def start_exporting(self):
+        meta = self.channel_meta
+        feed = {
+            "version": "https://jsonfeed.org/version/1.1",
+            "title": meta.get("title"),
+            "home_page_url": meta.get("link"),
+            "description": meta.get("description"),
+            "icon": getattr(meta.get("image"), "url", None),
+            "language": meta.get("language"),
+        }
+        feed = {key: value for key, value in feed.items() if value}
+        # Items are streamed into the trailing list
+        self._write(json.dumps(feed, ensure_ascii=False)[:-1] + ', "items": [')
+        self.first_item = True
+
+    def write_item(self, item):
+        entry = {
+            "id": item.url,
+            "url": item.url,
+            "title": item.title,
+            "content_html": item.rich_context,
+            "summary": item.summary,
+            "date_published": item.timestamp and item.timestamp.isoformat(),
+            "date_modified": item.updated_at and item.updated_at.isoformat(),
+            "authors": [{"name": author.name} for author in item.author],
+            "tags": [category.name for category in item.category],
+        }
+        if item.image is not None:
+            entry["image"] = item.image.url
+            entry["attachments"] = [
+                {
+                    "url": item.image.url,
+                    "mime_type": item.image.type or "",
+                    "size_in_bytes": int(item.image.length or 0),
+                }
+            ]
+        entry = {key: value for key, value in entry.items() if value}
+        separator = "" if self.first_item else ", "
+        self.first_item = False
+        self._write(separator + json.dumps(entry, ensure_ascii=False))
+
+    def write_footer(self):
+        self._write("]}")
+        self._flush()
+
+
+class ItemRecordExporter(FeedExporter):
+    """Write articles as JSON lines with all their fields.
+
+    Feeds leave fields out, incremental crawls merge the previous items from
+    these records, read by `read_item_records`.
+    """
+
+    def write_item(self, item):
+        self._write(json.dumps(asdict(item), ensure_ascii=False, default=str) + "\n")
+
+    def write_footer(self):
+        self._flush()
+
+
+# Output suffix -> (exporter, extra arguments), e.g. "slim.xml" writes
+# `appledaily.slim.xml`. Any suffix may be followed by ".gz" or ".br".
+FEED_FORMATS = {
+    "xml": (RSSExporter, {}),
+    "slim.xml": (RSSExporter, {"field_mapping": SLIM_ITEM_TO_RSS_MAPPING}),
+    "atom.xml": (AtomExporter, {}),
+    "json": (JSONFeedExporter, {}),
+}
+
+
+class BrotliFile:
+    """Minimal write-only file compressing to ``file`` with Brotli."""
+
+    def __init__(self, file, quality=11):
+        # Optional, only needed for ".br" feed outputs
+        import brotli
+
+        self.file = file
+        self.compressor = brotli.Compressor(quality=quality)
+
+    @staticmethod
+    def available():
+        # Without importing it, crawls writing no ".br" output don't pay for it
+        return importlib.util.find_spec("brotli") is not None
+
+    def write(self, data):
+        self.file.write(self.compressor.process(data))
+
+    def close(self):
+        self.file.write(self.compressor.finish())
+        self.file.close()
 
-    def _xg_raw_characters(self, content):
-        if content:
-            self.xg._finish_pending_start_element()
-            if not isinstance(content, str):
-                content = str(content, self.xg._encoding)
-            self.xg._write(content)
+
+class GzipFile(gzip.GzipFile):
+    """`gzip.GzipFile` closing the file it writes to."""
+
+    def close(self):
+        file = self.fileobj
+        super().close()
+        if file is not None:
+            file.close()
+
+
+def open_feed_file(path):
+    """Open ``path + ".tmp"`` for writing, compressed by the suffix of ``path``."""
+    file = open(f"{path}.tmp", "wb")
+    if path.endswith(".gz"):
+        # Name the uncompressed file in the header after the final path
+        return GzipFile(
+            filename=os.path.basename(path), mode="wb", compresslevel=9, fileobj=file
+        )
+    if path.endswith(".br"):
+        return BrotliFile(file)
+    return file
 
 
 class CouchDBExporter(PythonItemExporter):
-    def __init__(self, db_session, db_uri, ARTICLES_DB):
+    def __init__(
+        self, db_session, db_uri, ARTICLES_DB, batch_size=100, batch_interval=10
+    ):
         super().__init__(binary=False)
         self.db_session = db_session
         self.db_uri = db_uri
         self.ARTICLES_DB = ARTICLES_DB
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.docs = []
+        self.last_flush = monotonic()
 
-    def export_item(self, item):
+    def start_exporting(self):
+        self.last_flush = monotonic()
+
+    def buffer_item(self, item):
+        # Return the buffered documents once a batch should be written
         cleaned = {}
+        # Every field is sent, the image included
         for name, value in self._get_serialized_fields(item, default_value=""):
-            # Skip image
-            if name == "enclosure":
-                continue
+            cleaned[name] = _clean_item_field(value)
+
+        # Same article always maps to the same document
+        cleaned["_id"] = str(cleaned["id"])
+        self.docs.append(cleaned)
+        if (
+            len(self.docs) >= self.batch_size
+            or monotonic() - self.last_flush >= self.batch_interval
+        ):
+            return self.take_docs()
+        return None
 
-            # Cleanup data
-            value = _clean_item_field(value)
-            cleaned[name] = value
+    def export_item(self, item):
+        docs = self.buffer_item(item)
+        if docs:
+            self.write_docs(docs)
+
+    def finish_exporting(self):
+        docs = self.take_docs()
+        if docs:
+            self.write_docs(docs)
+
+    def take_due_docs(self):
+        # Buffered documents waiting since the last write for the batch interval
+        if self.docs and monotonic() - self.last_flush >= self.batch_interval:
+            return self.take_docs()
+        return None
+
+    def take_docs(self):
+        docs, self.docs = self.docs, []
+        self.last_flush = monotonic()
+        return docs
+
+    def write_docs(self, docs):
+        db_url = f"{self.db_uri}/{self.ARTICLES_DB}"
+        # Keep the last copy of documents repeated in a batch
+        docs = list({doc["_id"]: doc for doc in docs}.values())
+
+        # Attach current revisions, so existing documents are updated
+        response = self.db_session.post(
+            f"{db_url}/_all_docs", json={"keys": [doc["_id"] for doc in docs]}
+        )
+        response.raise_for_status()
+        revs = {
+            row["id"]: row["value"]["rev"]
+            for row in response.json()["rows"]
+            if "value" in row and not row["value"].get("deleted")
+        }
+        for doc in docs:
+            if doc["_id"] in revs:
+                doc["_rev"] = revs[doc["_id"]]
 
         # Add to database
-        self.db_session.put(
-            f"{self.db_uri}/{self.ARTICLES_DB}/{uuid4()}", json=cleaned
-        ).raise_for_status()
+        response = self.db_session.post(
+            f"{db_url}/_bulk_docs",
+            data=json.dumps({"docs": docs}, default=str),  # UUID ids
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        results = response.json()
+        for result in results:
+            if "error" in result:
+                logger.warning(
+                    "Failed to write document %s: %s (%s)",
+                    result.get("id"),
+                    result["error"],
+                    result.get("reason"),
+                )
+        return results
@@ -0,0 +1,58 @@
+import logging
+import os
+import shutil
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.job import job_dir
+
+logger = logging.getLogger(__name__)
+
+# Scheduler state Scrapy keeps in JOBDIR
+SCHEDULER_STATE = ("requests.seen", "requests.queue")
+
+
+class JobStateExtension:
+    # Make JOBDIR crawls resumable after a crash too. Scrapy saves the
+    # scheduler queue only when the crawl stops cleanly (finished, or paused
+    # with one Ctrl-C) but adds every scheduled request to requests.seen right
+    # away, so after a crash the queued requests are lost and still filtered
+    # as seen. A marker file left in JOBDIR tells a crashed crawl apart: its
+    # scheduler state is dropped, archive pages then link again to the
+    # articles RSSPipeline hasn't journaled. The state of a finished crawl is
+    # dropped too, the next crawl with the same JOBDIR starts over.
+
+    def __init__(self, path):
+        self.path = path
+        self.marker = os.path.join(path, "crawl.running")
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = job_dir(crawler.settings)
+        if path is None:
+            raise NotConfigured
+        ext = cls(path)
+        # Before the scheduler opens and loads the state
+        if os.path.exists(ext.marker):
+            logger.warning(
+                f"Crawl of {path} was interrupted, its request queue is lost: "
+                f"articles not exported yet are requested again"
+            )
+            ext.clear_scheduler_state()
+            crawler.stats.set_value("job/recovered", True)
+        open(ext.marker, "w").close()
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        if reason == "finished":
+            self.clear_scheduler_state()
+        os.remove(self.marker)
+
+    def clear_scheduler_state(self):
+        for name in SCHEDULER_STATE:
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,132 @@
+import re
+
+from lxml import etree
+from parsel import Selector
+from twisted.internet.defer import Deferred, DeferredSemaphore
+from twisted.python.failure import Failure
+
+TEXT = etree.XPath("string()", smart_strings=False)
+
+
+def _xpath(path, smart_strings=False):
+    # Missing selectors select nothing
+    if path is None:
+        return lambda root: []
+    return etree.XPath(path, smart_strings=smart_strings)
+
+
+def _first(values):
+    return values[0] if values else None
+
+
+def _search(pattern, texts):
+    if pattern is None:
+        return None
+    for text in texts:
+        match = pattern.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
+class ArticleExtractor:
+    """Extract article fields from the lxml root of an article page.
+
+    XPaths and patterns of the site config are compiled once and evaluated
+    directly on the lxml tree of the response. Paragraph texts are computed
+    once, summary, context, author and third party are all derived from them.
+    """
+
+    def __init__(self, site):
+        self.paragraphs = _xpath(site.paragraphs, smart_strings=True)
+        self.article_body = _xpath(site.article_body, smart_strings=True)
+        self.title = _xpath(site.title)
+        self.subtitle = _xpath(site.subtitle)
+        self.image_url = _xpath(site.image_url)
+        self.image_type = _xpath(site.image_type)
+        self.published_at = _xpath(site.published_at)
+        self.author_pattern = site.author_pattern and re.compile(site.author_pattern)
+        self.third_party_pattern = site.third_party_pattern and re.compile(
+            site.third_party_pattern
+        )
+
+    def __call__(self, root):
+        texts = [TEXT(paragraph) for paragraph in self.paragraphs(root)]
+        article_body = _first(self.article_body(root))
+        return {
+            "title": _first(self.title(root)),
+            "subtitle": _first(self.subtitle(root)),
+            "summary": texts[0] if texts else "",
+            "context": "\n".join(texts),
+            "rich_context": (
+                etree.tostring(
+                    article_body, method="html", encoding="unicode", with_tail=False
+                )
+                if article_body is not None
+                else None
+            ),
+            "author": _search(self.author_pattern, texts),
+            "third_party": _search(self.third_party_pattern, texts),
+            "image_url": _first(self.image_url(root)),
+            "image_type": _first(self.image_type(root)),
+            "published_at": _first(self.published_at(root)),  # Site local time
+        }
+
+
+# Extractor of the worker process, built once by `_init_worker`
+_worker_extractor = None
+
+
+def _init_worker(site):
+    global _worker_extractor
+    _worker_extractor = ArticleExtractor(site)
+
+
+def _extract_in_worker(text):
+    # Parsed like `response.selector`, so fields match inline extraction
+    return _worker_extractor(Selector(text=text, type="html").root)
+
+
+class ExtractionPool:
+    """Extract articles of a site in worker processes, off the reactor thread.
+
+    At most ``queue_size`` pages are in the pool at once. Callers wait for a
+    free place while it's full, holding their response, so downloads slow
+    down instead of pages piling up in memory.
+    """
+
+    def __init__(self, site, workers, queue_size):
+        # Imported here, it pulls in multiprocessing which inline extraction
+        # doesn't need
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(site,)
+        )
+        self.queue = DeferredSemaphore(queue_size)
+
+    def extract(self, text):
+        """Return a Deferred firing with the fields of the article page."""
+        return self.queue.run(self._submit, text)
+
+    def _submit(self, text):
+        from twisted.internet import reactor
+
+        d = Deferred()
+        future = self.executor.submit(_extract_in_worker, text)
+        # Done callbacks run in a thread of the executor
+        future.add_done_callback(
+            lambda future: reactor.callFromThread(self._fire, d, future)
+        )
+        return d
+
+    @staticmethod
+    def _fire(d, future):
+        exception = future.exception()
+        if exception is not None:
+            d.errback(Failure(exception))
+        else:
+            d.callback(future.result())
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,19 @@
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from twisted.internet.defer import succeed
+
+
+class SharedPoolDownloadHandler(HTTP11DownloadHandler):
+    # One connection pool for every crawler of the process. It stays open when
+    # a crawl ends, so the next crawl of a long-lived process (`scrapy daemon`,
+    # `scrapy crawlall`) reuses warm, already negotiated connections.
+    shared_pool = None
+
+    def __init__(self, settings, crawler=None):
+        super().__init__(settings, crawler)
+        if SharedPoolDownloadHandler.shared_pool is None:
+            SharedPoolDownloadHandler.shared_pool = self._pool
+        self._pool = SharedPoolDownloadHandler.shared_pool
+
+    def close(self):
+        # Connections are dropped when the process exits
+        return succeed(None)
@@ -2,19 +2,23 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional, Union
 from uuid import UUID, uuid4
 
-from pydantic import BaseModel
+# Plain dataclasses, so building an item costs no validation. Exporters read
+# the attributes directly, call `validate()` where checking is wanted.
 
 
-class Author(BaseModel):
-    id: Union[str, UUID] = uuid4()
+@dataclass
+class Author:
     name: str
+    id: Union[str, UUID] = field(default_factory=uuid4)
 
 
-class Image(BaseModel):
+@dataclass
+class Image:
     url: str
     title: Optional[str] = None
     link: Optional[str] = None
@@ -25,22 +29,53 @@ class Image(BaseModel):
     length: Optional[int] = None
 
 
-class Category(BaseModel):
-    id: Union[str, UUID] = uuid4()
+@dataclass
+class Category:
     name: str
+    id: Union[str, UUID] = field(default_factory=uuid4)
 
 
-class Article(BaseModel):
-    id: Union[str, UUID] = uuid4()
+@dataclass
+class Article:
     url: str  # link, guid
     title: str  # title
     summary: str  # description
     context: str  # description (complete raw text)
     rich_context: str  # description (complete HTML)
-    author: Optional[List[Author]] = []  # author
-    image: Optional[Image] = {}  # enclosure
-    category: Optional[List[Category]] = []  # category
+    id: Union[str, UUID] = field(default_factory=uuid4)
+    author: List[Author] = field(default_factory=list)  # author
+    image: Optional[Image] = None  # enclosure
+    category: List[Category] = field(default_factory=list)  # category
     timestamp: Optional[datetime] = None  # pubDate
     updated_at: Optional[datetime] = None
-    third_party: Optional[str]  # source
-    subtitle: Optional[str]
+    third_party: Optional[str] = None  # source
+    subtitle: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an article from its dict form, e.g. `ItemAdapter.asdict()`."""
+        data = dict(data)
+        data["author"] = [Author(**author) for author in data.get("author") or []]
+        data["category"] = [
+            Category(**category) for category in data.get("category") or []
+        ]
+        if data.get("image"):
+            data["image"] = Image(**data["image"])
+        else:
+            data["image"] = None
+        return cls(**data)
+
+    def validate(self):
+        for name in ("url", "title", "summary", "context", "rich_context"):
+            if not isinstance(getattr(self, name), str):
+                raise ValueError(f"Article.{name} must be a string")
+        for name in ("timestamp", "updated_at"):
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, datetime):
+                raise ValueError(f"Article.{name} must be a datetime")
+        if not all(isinstance(author, Author) for author in self.author):
+            raise ValueError("Article.author must be a list of Author")
+        if not all(isinstance(category, Category) for category in self.category):
+            raise ValueError("Article.category must be a list of Category")
+        if self.image is not None and not isinstance(self.image, Image):
+            raise ValueError("Article.image must be an Image")
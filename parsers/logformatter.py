@@ -0,0 +1,17 @@
+import logging
+
+from scrapy import logformatter
+
+from parsers.pipelines import NearDuplicateItem, UnchangedItem
+
+
+class LogFormatter(logformatter.LogFormatter):
+    def dropped(self, item, exception, response, spider):
+        entry = super().dropped(item, exception, response, spider)
+        # Most articles of a re-crawl are unchanged, not worth a warning each
+        if isinstance(exception, UnchangedItem):
+            entry["level"] = logging.DEBUG
+        # Expected too, but rare enough to be worth a line each
+        elif isinstance(exception, NearDuplicateItem):
+            entry["level"] = logging.INFO
+        return entry
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import re
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+try:
+    import resource
+except ImportError:  # Windows, memory isn't reported
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ru_maxrss is in KiB, in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of the process so far, 0 if unknown."""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def record_time(stats, stage, seconds, spider=None):
+    """Add one call of ``stage`` taking ``seconds`` to the crawl stats."""
+    stats.inc_value(f"timing/{stage}/count", spider=spider)
+    stats.inc_value(f"timing/{stage}/seconds", seconds, spider=spider)
+    stats.max_value(f"timing/{stage}/max_seconds", seconds, spider=spider)
+
+
+@contextmanager
+def timed(stats, stage, spider=None):
+    # Growth of the peak RSS during the stage is added to
+    # memory/<stage>/peak_rss_bytes, the stages the process peaked in
+    peak = peak_rss_bytes()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record_time(stats, stage, perf_counter() - start, spider)
+        growth = peak_rss_bytes() - peak
+        if growth:
+            stats.inc_value(f"memory/{stage}/peak_rss_bytes", growth, spider=spider)
+
+
+def _prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(stats, spider_name):
+    """Format crawl stats in the Prometheus text exposition format."""
+    spider = f'spider="{_prometheus_label(spider_name)}"'
+    stages, others = {}, []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        match = re.fullmatch(r"timing/(.+)/(count|seconds|max_seconds)", key)
+        if match:
+            stages.setdefault(match.group(2), []).append((match.group(1), value))
+        else:
+            others.append((key, value))
+
+    lines = []
+    for name, suffix, type in (
+        ("count", "calls_total", "counter"),
+        ("seconds", "seconds_total", "counter"),
+        ("max_seconds", "max_seconds", "gauge"),
+    ):
+        metric = f"scrapy_stage_{suffix}"
+        lines.append(f"# TYPE {metric} {type}")
+        for stage, value in stages.get(name, []):
+            label = _prometheus_label(stage)
+            lines.append(f'{metric}{{{spider},stage="{label}"}} {value}')
+    lines.append("# TYPE scrapy_stat gauge")
+    for key, value in others:
+        lines.append(f'scrapy_stat{{{spider},key="{_prometheus_label(key)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExtension:
+    # Time downloads into the per-stage stats, dump the stats as Prometheus
+    # text / JSON when the spider closes, and profile the crawl on request
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+        settings = crawler.settings
+        self.prometheus_path = settings.get("METRICS_PROMETHEUS_PATH")
+        self.json_path = settings.get("METRICS_JSON_PATH")
+        self.profiler_name = settings.get("PROFILER")
+        self.profile_path = settings.get("PROFILER_OUTPUT")
+        self.profiler = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+        ext = cls(crawler)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        if self.profiler_name == "cprofile":
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profiler_name == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("pyinstrument is not installed, crawl not profiled")
+                return
+            self.profiler = Profiler(async_mode="disabled")
+            self.profiler.start()
+        elif self.profiler_name:
+            logger.warning(f"Unknown profiler {self.profiler_name}, crawl not profiled")
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            record_time(self.stats, "download", latency, spider)
+
+    def spider_closed(self, spider):
+        if self.profiler is not None:
+            self._save_profile(spider)
+        self.stats.set_value("memory/peak_rss_bytes", peak_rss_bytes(), spider=spider)
+        stats = self.stats.get_stats(spider)
+        if self.prometheus_path:
+            self._write(self.prometheus_path, format_prometheus(stats, spider.name))
+        if self.json_path:
+            self._write(
+                self.json_path,
+                json.dumps(stats, indent=2, sort_keys=True, default=str),
+            )
+
+    def _save_profile(self, spider):
+        path = self.profile_path or f"{spider.name}.profile"
+        if self.profiler_name == "cprofile":
+            self.profiler.disable()
+            self.profiler.dump_stats(f"{path}.prof")
+            logger.info(f"cProfile stats saved to {path}.prof")
+        else:
+            self.profiler.stop()
+            self._write(f"{path}.html", self.profiler.output_html())
+            logger.info(f"pyinstrument profile saved to {path}.html")
+        self.profiler = None
+
+    @staticmethod
+    def _write(path, text):
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(f"{path}.tmp", path)
@@ -3,8 +3,18 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import pickle
+import re
+from time import monotonic
+
 # useful for handling different item types with a single interface
+from itemadapter import ItemAdapter
 from scrapy import signals
+from scrapy.downloadermiddlewares.robotstxt import RobotsTxtMiddleware
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+from parsers.stores import FingerprintStore
 
 
 class NewsSpiderMiddleware:
@@ -99,3 +109,238 @@ class NewsDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info(f"Spider opened: {spider.name}")
+
+
+class ConditionalRequestMiddleware:
+    # Revalidate pages parsed in earlier crawls with If-None-Match /
+    # If-Modified-Since. On 304 the item parsed last time is put in
+    # `response.meta["cached_item"]` for the callback to replay. Validators
+    # are only stored with the item parsed from the page, pages without an
+    # item (archive pages) are not revalidated.
+
+    def __init__(self, store, stats):
+        self.store = store
+        self.stats = stats
+        # url -> validators of a page fetched in this crawl, until its item is
+        # scraped (maybe from a later response, e.g. of the article image)
+        self.validators = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CONDITIONAL_CACHE_ENABLED"):
+            raise NotConfigured
+        s = cls(
+            FingerprintStore(crawler.settings["CONDITIONAL_CACHE_PATH"]),
+            crawler.stats,
+        )
+        crawler.signals.connect(s.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        if request.method != "GET":
+            return None
+        page = self.store.get(request.url)
+        if page is None or page[2] is None:
+            return None
+
+        etag, last_modified, _ = page
+        if etag:
+            request.headers.setdefault("If-None-Match", etag)
+        if last_modified:
+            request.headers.setdefault("If-Modified-Since", last_modified)
+        request.meta["handle_httpstatus_list"] = [
+            *request.meta.get("handle_httpstatus_list", []),
+            304,
+        ]
+        return None
+
+    def process_response(self, request, response, spider):
+        if request.method != "GET":
+            return response
+
+        if response.status == 304:
+            page = self.store.get(request.url)
+            if page is not None and page[2] is not None:
+                request.meta["cached_item"] = pickle.loads(page[2])
+                self.stats.inc_value("conditional/not_modified", spider=spider)
+        elif response.status == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                # Stored by item_scraped, once the page produced an item
+                self.validators[request.url] = (
+                    etag and etag.decode("latin-1"),
+                    last_modified and last_modified.decode("latin-1"),
+                )
+        return response
+
+    def item_scraped(self, item, response, spider):
+        # Replayed items and pages without validators keep the stored page
+        adapter = ItemAdapter(item)
+        validators = self.validators.pop(adapter["url"], None)
+        if validators is None:
+            return
+        self.store.set(
+            adapter["url"],
+            *validators,
+            pickle.dumps(adapter.asdict(), protocol=pickle.HIGHEST_PROTOCOL),
+        )
+        self.stats.inc_value("conditional/modified", spider=spider)
+
+    def spider_closed(self, spider):
+        self.validators.clear()
+        self.store.close()
+
+
+class AdaptiveConcurrencyMiddleware:
+    # Put archive, article and image requests in their own download slots and
+    # tune each slot's concurrency like TCP congestion control: +1 after a
+    # window of fast responses, halved (at most once per window) when latency
+    # exceeds the target or the site answers 429/503. Rate limited slots also
+    # get a download delay, from Retry-After when given.
+
+    def __init__(self, crawler, slots, max_delay):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.slots = [
+            (kind, re.compile(config["pattern"]), config)
+            for kind, config in slots.items()
+        ]
+        self.max_delay = max_delay
+        self.state = {}  # download slot -> SlotState
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        return cls(
+            crawler,
+            crawler.settings.getdict("ADAPTIVE_CONCURRENCY_SLOTS"),
+            crawler.settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_DELAY"),
+        )
+
+    def _classify(self, request):
+        for kind, pattern, config in self.slots:
+            if pattern.search(request.url):
+                return kind, config
+        return None, None
+
+    def process_request(self, request, spider):
+        if "download_slot" in request.meta:
+            state = self.state.get(request.meta["download_slot"])
+        else:
+            kind, config = self._classify(request)
+            if kind is None:
+                return None
+            key = f"{urlparse_cached(request).hostname}/{kind}"
+            request.meta["download_slot"] = key
+            state = self.state.get(key)
+            if state is None:
+                state = self.state[key] = SlotState(kind, config)
+                self._record(state, spider)
+        if state is not None:
+            self._apply(request.meta["download_slot"], state)
+        return None
+
+    def process_response(self, request, response, spider):
+        state = self.state.get(request.meta.get("download_slot"))
+        latency = request.meta.get("download_latency")
+        if state is None or latency is None or "cached" in response.flags:
+            return response
+
+        state.latency += (latency - state.latency) * 0.2 if state.latency else latency
+        if response.status in (429, 503):
+            self.stats.inc_value(f"adaptive/{state.kind}/throttled", spider=spider)
+            retry_after = response.headers.get("Retry-After")
+            delay = state.delay * 2 or 0.25
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            state.delay = min(delay, self.max_delay)
+            self._decrease(state)
+        elif state.latency > state.target_latency:
+            self._decrease(state)
+        else:
+            # Recover from rate limiting before growing concurrency
+            state.delay = state.delay / 2 if state.delay > 0.01 else 0.0
+            state.successes += 1
+            if state.successes >= state.concurrency:
+                state.successes = 0
+                state.concurrency = min(state.concurrency + 1, state.max_concurrency)
+        self._record(state, spider)
+        self._apply(request.meta["download_slot"], state)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        # Timeouts and dropped connections count as congestion
+        state = self.state.get(request.meta.get("download_slot"))
+        if state is not None:
+            self.stats.inc_value(f"adaptive/{state.kind}/errors", spider=spider)
+            self._decrease(state)
+            self._record(state, spider)
+            self._apply(request.meta["download_slot"], state)
+        return None
+
+    def _decrease(self, state):
+        # Responses already in flight report the same congestion, ignore them
+        if monotonic() - state.decreased_at < max(state.latency, 0.1):
+            return
+        state.decreased_at = monotonic()
+        state.successes = 0
+        state.concurrency = max(state.concurrency // 2, 1)
+
+    def _apply(self, key, state):
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is not None:
+            slot.concurrency = state.concurrency
+            slot.delay = state.delay
+
+    def _record(self, state, spider):
+        self.stats.set_value(
+            f"adaptive/{state.kind}/concurrency", state.concurrency, spider=spider
+        )
+        self.stats.max_value(
+            f"adaptive/{state.kind}/max_concurrency", state.concurrency, spider=spider
+        )
+        self.stats.set_value(
+            f"adaptive/{state.kind}/delay", round(state.delay, 3), spider=spider
+        )
+        self.stats.set_value(
+            f"adaptive/{state.kind}/latency_ms",
+            round(state.latency * 1000, 1),
+            spider=spider,
+        )
+
+
+class SlotState:
+    def __init__(self, kind, config):
+        self.kind = kind
+        self.max_concurrency = config["max_concurrency"]
+        self.concurrency = min(config["start_concurrency"], self.max_concurrency)
+        self.target_latency = config["target_latency"]
+        self.latency = 0.0  # Moving average of download latency
+        self.delay = 0.0
+        self.successes = 0
+        self.decreased_at = 0.0
+
+
+class SharedRobotsTxtMiddleware(RobotsTxtMiddleware):
+    # Parsed robots.txt kept for ROBOTSTXT_CACHE_TTL seconds and shared by every
+    # crawler of the process, a crawl re-run by a long-lived process doesn't
+    # download robots.txt again
+    cache = {}  # netloc -> (parser, fetched at)
+
+    def __init__(self, crawler):
+        super().__init__(crawler)
+        ttl = crawler.settings.getfloat("ROBOTSTXT_CACHE_TTL")
+        now = monotonic()
+        for netloc, (parser, fetched_at) in list(self.cache.items()):
+            if now - fetched_at < ttl:
+                self._parsers[netloc] = parser
+                crawler.stats.inc_value("robotstxt/cached")
+            else:
+                del self.cache[netloc]
+
+    def _parse_robots(self, response, netloc, spider):
+        super()._parse_robots(response, netloc, spider)
+        SharedRobotsTxtMiddleware.cache[netloc] = (self._parsers[netloc], monotonic())
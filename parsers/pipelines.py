@@ -1,60 +1,493 @@
 import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
 
-import requests
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.job import job_dir
+from scrapy.utils.log import failure_to_exc_info
+from twisted.internet import task
+from twisted.internet.defer import DeferredList, DeferredSemaphore, succeed
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
 
-from parsers.exporters import CouchDBExporter, RSSExporter
+from parsers.exporters import (
+    FEED_FORMATS,
+    FeedItems,
+    ItemJournal,
+    BrotliFile,
+    ItemRecordExporter,
+    open_feed_file,
+    read_item_records,
+    read_rss_items,
+)
+from parsers.metrics import record_time, timed
+from parsers.sanitizers import HTMLSanitizer, truncate_html
+from parsers.stores import ArchiveStore, ContentHashStore, MinHashStore, SearchIndex
 
-ITEM_TO_RSS_MAPPING = {
-    "url": ["link", "guid"],
-    "rich_context": ["description"],
-    "image": ["enclosure"],
-    "timestamp": ["pubDate"],
-    "third_party": ["source"],
-}
+# Suffix of the full items kept next to a feed in incremental mode
+ITEM_RECORDS = "items.jsonl"
+# Items exported by RSSPipeline in a JOBDIR crawl, kept until it finishes
+JOURNAL = "feed_items.journal"
 
 
-def extend_to_rss_field(item):
-    new_fields = {}
-    for field, value in item.items():
-        if field in ITEM_TO_RSS_MAPPING:
-            for rss_field in ITEM_TO_RSS_MAPPING[field]:
-                new_fields[rss_field] = value
-    item.update(new_fields)
-    item["image"]
-    return item
+class ValidationPipeline:
+    # Items are not validated when built, enable this pipeline to check them
+    def process_item(self, item, spider):
+        try:
+            item.validate()
+        except ValueError as e:
+            raise DropItem(str(e))
+        return item
+
+
+class SanitizePipeline:
+    # Clean the HTML of `rich_context` before it's hashed and exported: drop
+    # scripts, ads and attributes not in the allowlist, point lazy loaded
+    # images at their real url and collapse whitespace. Then cut it to
+    # RICH_CONTEXT_MAX_BYTES. Sizes before and after are kept in the stats,
+    # and logged per item at DEBUG.
+
+    def __init__(self, max_bytes=None):
+        self.sanitizer = HTMLSanitizer()
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getint("RICH_CONTEXT_MAX_BYTES") or None)
+
+    def process_item(self, item, spider):
+        if not item.rich_context:
+            return item
+        stats = spider.crawler.stats
+        size = len(item.rich_context.encode())
+        with timed(stats, "sanitize", spider):
+            item.rich_context = self.sanitizer(item.rich_context, base_url=item.url)
+            sanitized_size = len(item.rich_context.encode())
+            if self.max_bytes is not None and sanitized_size > self.max_bytes:
+                item.rich_context = truncate_html(item.rich_context, self.max_bytes)
+                sanitized_size = len(item.rich_context.encode())
+                stats.inc_value("sanitize/truncated", spider=spider)
+        stats.inc_value("sanitize/bytes_in", size, spider=spider)
+        stats.inc_value("sanitize/bytes_out", sanitized_size, spider=spider)
+        stats.inc_value("sanitize/bytes_saved", size - sanitized_size, spider=spider)
+        stats.max_value(
+            "sanitize/max_bytes_saved", size - sanitized_size, spider=spider
+        )
+        spider.logger.debug(
+            f"Sanitized rich context of {item.url}: {size} -> {sanitized_size} bytes"
+        )
+        return item
+
+
+class UnchangedItem(DropItem):
+    # Dropped by ChangeDetectionPipeline, logged at DEBUG by LogFormatter
+    pass
+
+
+class ChangeDetectionPipeline:
+    # Drop articles whose content hasn't changed since the last crawl and set
+    # `updated_at` on changed ones, so feeds, archive and CouchDB only get new
+    # writes. Needs RSS_INCREMENTAL, otherwise dropped articles would be
+    # missing from the rebuilt feed. Hashes are kept per feed file, an article
+    # is only unchanged for the feed it was exported to before.
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("RSS_INCREMENTAL"):
+            raise NotConfigured
+        return cls()
+
+    def open_spider(self, spider):
+        self.store = ContentHashStore(spider.settings.get("CHANGE_DETECTION_PATH"))
+
+    def close_spider(self, spider):
+        self.store.close()
+
+    @staticmethod
+    def content_hash(item):
+        # Whitespace only changes don't count
+        content = " ".join((item.context or "").split())
+        rich_content = " ".join((item.rich_context or "").split())
+        return zlib.crc32(f"{content}\0{rich_content}".encode())
+
+    def process_item(self, item, spider):
+        stats = spider.crawler.stats
+        content_hash = self.content_hash(item)
+        feed = spider.get_file_name(item)
+        previous = self.store.get(feed, item.url)
+        if previous is None:
+            stats.inc_value("change/new", spider=spider)
+        elif previous[0] == content_hash:
+            stats.inc_value("change/unchanged", spider=spider)
+            raise UnchangedItem(f"Unchanged since {previous[1]}: {item.url}")
+        else:
+            item.updated_at = datetime.now(timezone.utc)
+            stats.inc_value("change/updated", spider=spider)
+        updated_at = item.updated_at or item.timestamp
+        self.store.set(
+            feed, item.url, content_hash, updated_at and updated_at.isoformat()
+        )
+        return item
+
+
+class NearDuplicateItem(DropItem):
+    # Dropped by NearDuplicatePipeline, logged at INFO by LogFormatter
+    pass
+
+
+class NearDuplicatePipeline:
+    # Drop articles whose context is nearly the same as the one of an article
+    # kept before under another url, in this crawl or a previous one: wire
+    # stories republished with small edits, articles of yesterday crawled
+    # again under a new url. The first article seen is the one kept. Feeds
+    # rebuilt from scratch (no RSS_INCREMENTAL) don't have the articles of
+    # previous crawls, so articles are only compared with this crawl's.
+
+    def __init__(self, path, min_similarity):
+        self.path = path
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("NEAR_DUPLICATE_ENABLED"):
+            raise NotConfigured
+        return cls(
+            (
+                settings.get("NEAR_DUPLICATE_PATH")
+                if settings.getbool("RSS_INCREMENTAL")
+                else ":memory:"
+            ),
+            settings.getfloat("NEAR_DUPLICATE_SIMILARITY"),
+        )
+
+    def open_spider(self, spider):
+        self.store = MinHashStore(self.path)
+
+    def close_spider(self, spider):
+        self.store.close()
+
+    def process_item(self, item, spider):
+        stats = spider.crawler.stats
+        with timed(stats, "near_duplicate", spider):
+            signature = item.context and MinHashStore.signature(item.context)
+            if not signature:
+                # Too short to tell
+                return item
+            match = self.store.find(signature, self.min_similarity, exclude=item.url)
+            if match is None:
+                self.store.set(item.url, signature)
+        if match is not None:
+            stats.inc_value("near_duplicate/dropped", spider=spider)
+            url, similarity = match
+            raise NearDuplicateItem(
+                f"Near duplicate of {url} ({similarity:.0%} similar): {item.url}"
+            )
+        return item
 
 
 class RSSPipeline:
+    # With JOBDIR set, exported items are also appended to a journal in the
+    # job directory. A crawl resumed after a pause or a crash replays it into
+    # the feeds and doesn't request those articles again. The journal is
+    # removed once the crawl finishes.
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls()
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
     def open_spider(self, spider):
-        self.file = open(f"{spider.file_name}.xml", "wb")
-        self.exporter = RSSExporter(self.file, spider.metadata, indent=2)
-        self.exporter.start_exporting()
+        # (suffix, exporter class, extra arguments) of every output of a feed
+        self.outputs = []
+        for suffix in spider.settings.getlist("RSS_OUTPUTS"):
+            format_name = suffix.removesuffix(".gz").removesuffix(".br")
+            if format_name not in FEED_FORMATS:
+                raise ValueError(f"Unknown feed output: {suffix}")
+            if suffix.endswith(".br") and not BrotliFile.available():
+                spider.logger.warning(f"brotli is not installed, skipped {suffix}")
+                continue
+            exporter_class, options = FEED_FORMATS[format_name]
+            self.outputs.append((suffix, exporter_class, options))
+        if spider.settings.getbool("RSS_INCREMENTAL"):
+            # Feeds written before the item records are merged from the RSS feed
+            if "xml" not in spider.settings.getlist("RSS_OUTPUTS"):
+                raise ValueError('RSS_INCREMENTAL needs "xml" in RSS_OUTPUTS')
+            # Full items of the feed, merged into it by the next crawl
+            self.outputs.append((ITEM_RECORDS, ItemRecordExporter, {}))
+
+        self.feeds = {}
+        for file_name in spider.file_names:
+            self._open_feed(file_name, spider)
+
+        self.journal = None
+        path = job_dir(spider.settings)
+        if path is not None:
+            self.journal = ItemJournal(os.path.join(path, JOURNAL))
+            self._replay_journal(spider)
+
+    def _replay_journal(self, spider):
+        count = 0
+        for file_name, item in self.journal:
+            self._feed_items(file_name, spider).append(item)
+            # Exported before the crawl stopped, not requested again
+            spider.known_urls.add(item.url)
+            count += 1
+        if count:
+            spider.logger.info(f"Resumed {count} items from {self.journal.path}")
+            spider.crawler.stats.set_value("rss/resumed_items", count, spider=spider)
+
+    def _feed_items(self, file_name, spider):
+        if file_name in self.feeds:
+            return self.feeds[file_name][0]
+        return self._open_feed(file_name, spider)
+
+    def _open_feed(self, file_name, spider):
+        settings = spider.settings
+        items = FeedItems(
+            buffer_size=settings.getint("RSS_EXPORT_BUFFER_SIZE"),
+            buffer_bytes=settings.getint("RSS_EXPORT_BUFFER_BYTES") or None,
+            max_items=settings.getint("RSS_MAX_ITEMS") or None,
+            max_age=timedelta(days=settings.getfloat("RSS_MAX_AGE_DAYS")) or None,
+        )
+        if settings.getbool("RSS_INCREMENTAL"):
+            for item in self._previous_items(file_name):
+                items.merge_previous(item)
+                # Spider skips articles already in the feed
+                if settings.getbool("RSS_INCREMENTAL_SKIP_KNOWN"):
+                    spider.known_urls.add(item.url)
+
+        # Write to temporary files, the previous feed is still needed for merging
+        exporters = []
+        for suffix, exporter_class, options in self.outputs:
+            file = open_feed_file(f"{file_name}.{suffix}")
+            exporter = exporter_class(
+                file,
+                spider.metadata,
+                items=items,
+                indent=2,
+                source_feeds=spider.site.source_feeds,
+                **options,
+            )
+            exporter.start_exporting()
+            exporters.append((suffix, file, exporter))
+        self.feeds[file_name] = (items, exporters)
+        return items
+
+    @staticmethod
+    def _previous_items(file_name):
+        records_path = f"{file_name}.{ITEM_RECORDS}"
+        if os.path.exists(records_path):
+            with open(records_path, "rb") as records:
+                yield from read_item_records(records)
+        elif os.path.exists(f"{file_name}.xml"):
+            # Written before item records were kept, summary and context are lost
+            with open(f"{file_name}.xml", "rb") as previous_feed:
+                yield from read_rss_items(previous_feed)
+
+    def close_spider(self, spider):
+        for file_name, (items, exporters) in self.feeds.items():
+            # Items are merged once and written to every output
+            with timed(spider.crawler.stats, "rss_finish", spider):
+                for item in items:
+                    for _, _, exporter in exporters:
+                        exporter.write_item(item)
+                items.close()
+                for suffix, file, exporter in exporters:
+                    exporter.write_footer()
+                    file.close()
+                    os.replace(f"{file_name}.{suffix}.tmp", f"{file_name}.{suffix}")
+        if self.journal is not None:
+            self.journal.close()
+
+    def spider_closed(self, spider, reason):
+        # Kept when paused or shut down, the resumed crawl needs it
+        if self.journal is not None and reason == "finished":
+            os.remove(self.journal.path)
+
+    def process_item(self, item, spider):
+        file_name = spider.get_file_name(item)
+        items = self._feed_items(file_name, spider)
+        with timed(spider.crawler.stats, "rss_spool", spider):
+            items.append(item)
+            if self.journal is not None:
+                self.journal.append(file_name, item)
+        return item
+
+
+def _journaled_items(spider):
+    # Items exported before a JOBDIR crawl was paused or killed. Resumed crawls
+    # don't request them again, pipelines after RSSPipeline whose writes were
+    # lost with the process (stores only commit when closed) add them again.
+    path = job_dir(spider.settings)
+    if path is None or not os.path.exists(os.path.join(path, JOURNAL)):
+        return
+    journal = ItemJournal(os.path.join(path, JOURNAL))
+    try:
+        for _, item in journal:
+            yield item
+    finally:
+        journal.close()
+
+
+class ArchivePipeline:
+    # Keep every article in the partitioned archive, feeds for any date range
+    # or category are generated from it with `scrapy feed`
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ARCHIVE_ENABLED"):
+            raise NotConfigured
+        return cls()
+
+    def open_spider(self, spider):
+        self.store = ArchiveStore(
+            os.path.join(spider.settings.get("ARCHIVE_PATH"), spider.name)
+        )
+        # Already archived items are skipped
+        for item in _journaled_items(spider):
+            self.process_item(item, spider)
+
+    def close_spider(self, spider):
+        self.store.close()
+
+    def process_item(self, item, spider):
+        with timed(spider.crawler.stats, "archive_add", spider):
+            added = self.store.add(item)
+        if added:
+            spider.crawler.stats.inc_value("archive/added", spider=spider)
+        return item
+
+
+class SearchPipeline:
+    # Keep a full-text index of articles next to their archive, `scrapy
+    # search` reads the articles it matches from the archive
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("SEARCH_ENABLED"):
+            raise NotConfigured
+        return cls()
+
+    def open_spider(self, spider):
+        path = os.path.join(spider.settings.get("ARCHIVE_PATH"), spider.name)
+        os.makedirs(path, exist_ok=True)
+        self.index = SearchIndex(os.path.join(path, "search.sqlite"))
+        # Already indexed items are skipped
+        for item in _journaled_items(spider):
+            self.process_item(item, spider)
 
     def close_spider(self, spider):
-        self.exporter.finish_exporting()
-        self.file.close()
+        self.index.close()
 
     def process_item(self, item, spider):
-        item = extend_to_rss_field(item.dict())
-        self.exporter.export_item(item)
+        with timed(spider.crawler.stats, "search_index", spider):
+            indexed = self.index.add(item)
+        if indexed:
+            spider.crawler.stats.inc_value("search/indexed", spider=spider)
         return item
 
 
 class CouchDBPipeline:
     def open_spider(self, spider):
+        # Imported here, crawls without this pipeline don't pay for requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        from parsers.exporters import CouchDBExporter
+
+        concurrency = spider.settings.getint("COUCHDB_CONCURRENCY")
         self.db_session = requests.Session()
         self.db_session.auth = (
             os.environ.get("COUCHDB_USER"),
             os.environ.get("COUCHDB_PASSWORD"),
         )
+        adapter = HTTPAdapter(pool_maxsize=concurrency)
+        self.db_session.mount("http://", adapter)
+        self.db_session.mount("https://", adapter)
         self.db_uri = os.environ.get("COUCHDB_HOST")
         self.ARTICLES_DB = "articles"
-        self.exporter = CouchDBExporter(self.db_session, self.db_uri, self.ARTICLES_DB)
+        self.exporter = CouchDBExporter(
+            self.db_session,
+            self.db_uri,
+            self.ARTICLES_DB,
+            batch_size=spider.settings.getint("COUCHDB_BATCH_SIZE"),
+            batch_interval=spider.settings.getfloat("COUCHDB_BATCH_INTERVAL"),
+        )
         self.exporter.start_exporting()
 
+        # Blocking writes run in their own threads, at most `concurrency` at once
+        self.thread_pool = ThreadPool(
+            minthreads=1, maxthreads=concurrency, name="CouchDBPipeline"
+        )
+        self.thread_pool.start()
+        self.write_slots = DeferredSemaphore(concurrency)
+        self.writes = set()
+
+        # Items only check the batch interval when they arrive, a timer writes
+        # the documents left waiting once the crawl slows down or stalls
+        self.flush_loop = task.LoopingCall(self._flush_due_docs, spider)
+        if self.exporter.batch_interval > 0:
+            self.flush_loop.start(min(self.exporter.batch_interval, 1), now=False)
+
     def close_spider(self, spider):
-        self.exporter.finish_exporting()
+        if self.flush_loop.running:
+            self.flush_loop.stop()
+        last_write = self._write_docs(self.exporter.take_docs(), spider)
+        last_write.addErrback(self._log_write_error, spider)
+        d = DeferredList([*self.writes, last_write], consumeErrors=True)
+        d.addBoth(lambda _: self.thread_pool.stop())
+        return d
 
     def process_item(self, item, spider):
-        self.exporter.export_item(item)
-        return item
+        docs = self.exporter.buffer_item(item)
+        if not docs:
+            return item
+        # The item that fills a batch waits for its write. While writes are
+        # queued its response stays in the scraper, so downloads back off.
+        d = self._write_docs(docs, spider)
+        d.addCallback(lambda _: item)
+        return d
+
+    def _flush_due_docs(self, spider):
+        d = self._write_docs(self.exporter.take_due_docs(), spider)
+        d.addErrback(self._log_write_error, spider)
+
+    def _log_write_error(self, failure, spider):
+        spider.logger.error(
+            "Failed to write documents to CouchDB",
+            exc_info=failure_to_exc_info(failure),
+        )
+
+    def _write_docs(self, docs, spider):
+        from twisted.internet import reactor
+
+        if not docs:
+            return succeed(None)
+        d = self.write_slots.run(
+            deferToThreadPool,
+            reactor,
+            self.thread_pool,
+            self._timed_write_docs,
+            docs,
+        )
+        # Stats are not thread safe, record the time back on the reactor thread
+        d.addCallback(self._record_write, spider)
+        self.writes.add(d)
+        d.addBoth(self._discard_write, d)
+        return d
+
+    def _timed_write_docs(self, docs):
+        start = perf_counter()
+        results = self.exporter.write_docs(docs)
+        return results, perf_counter() - start
+
+    def _record_write(self, result, spider):
+        results, seconds = result
+        record_time(spider.crawler.stats, "couchdb_write", seconds, spider)
+        return results
+
+    def _discard_write(self, result, d):
+        self.writes.discard(d)
+        return result
@@ -0,0 +1,237 @@
+import re
+
+from lxml import etree, html
+
+# Removed along with their content
+DROPPED_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "iframe",
+    "object",
+    "embed",
+    "form",
+    "button",
+    "input",
+    "select",
+    "textarea",
+    "svg",
+    "link",
+    "meta",
+    etree.Comment,
+    etree.ProcessingInstruction,
+)
+# Ad slots and sponsored blocks, removed along with their content
+AD_CONTAINERS = etree.XPath(
+    "descendant::*[re:test(@class, $pattern, 'i') or re:test(@id, $pattern, 'i')]",
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+# Ad slots of ad networks (<ins class="adsbygoogle">) too, other <ins> are text
+AD_PATTERN = r"(^|[\s_-])(ad|ads|adsbygoogle|advert\w*|sponsor\w*|promo\w*)($|[\s_-])"
+# Tag -> attributes kept, other tags are replaced by their content
+ALLOWED_TAGS = {
+    **dict.fromkeys(
+        (
+            "div",
+            "p",
+            "br",
+            "hr",
+            "b",
+            "strong",
+            "i",
+            "em",
+            "u",
+            "s",
+            "small",
+            "sub",
+            "sup",
+            "code",
+            "pre",
+            "blockquote",
+            "h1",
+            "h2",
+            "h3",
+            "h4",
+            "h5",
+            "h6",
+            "ul",
+            "ol",
+            "li",
+            "figure",
+            "figcaption",
+            "table",
+            "caption",
+            "thead",
+            "tbody",
+            "tr",
+        ),
+        frozenset(),
+    ),
+    "a": frozenset({"href", "title"}),
+    "img": frozenset({"src", "alt", "title", "width", "height"}),
+    "td": frozenset({"colspan", "rowspan"}),
+    "th": frozenset({"colspan", "rowspan"}),
+}
+# Kept even when empty
+EMPTY_TAGS = frozenset({"br", "hr", "img", "td", "th"})
+# Whitespace around these is not rendered
+BLOCK_TAGS = frozenset(ALLOWED_TAGS) - frozenset(
+    {
+        "a",
+        "b",
+        "br",
+        "code",
+        "em",
+        "i",
+        "img",
+        "s",
+        "small",
+        "strong",
+        "sub",
+        "sup",
+        "u",
+    }
+)
+# Attributes lazy loading scripts read the image url from
+LAZY_SRC_ATTRIBUTES = ("data-src", "data-original", "data-lazy-src", "data-lazy")
+URL_ATTRIBUTES = ("href", "src")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _inner_html(wrapper):
+    return (
+        (wrapper.text or "")
+        + "".join(html.tostring(child, encoding="unicode") for child in wrapper)
+    ).strip()
+
+
+def _size(element):
+    # Bytes of the markup of `element`, its tail included
+    return len(html.tostring(element, encoding="unicode").encode())
+
+
+def truncate_html(markup, max_bytes):
+    """Cut HTML to its leading content of at most about ``max_bytes`` bytes.
+
+    The cut is between elements, or in the text of the element it falls in,
+    and the markup stays well formed: elements cut are closed.
+    """
+    wrapper = html.fragment_fromstring(markup, create_parent="div")
+    _truncate(wrapper, max_bytes)
+    return _inner_html(wrapper)
+
+
+def _truncate(element, budget):
+    # Keep what fits in `budget` bytes of the content of `element`
+    text = element.text or ""
+    if len(text.encode()) > budget:
+        element.text = text.encode()[:budget].decode(errors="ignore")
+        budget = 0
+    else:
+        budget -= len(text.encode())
+    for child in list(element):
+        size = _size(child)
+        if size <= budget:
+            budget -= size
+            continue
+        # Start and end tags of the child
+        child.tail = None
+        content_size = len((child.text or "").encode()) + sum(map(_size, child))
+        tags_size = _size(child) - content_size
+        if len(child) or child.text:
+            _truncate(child, max(budget - tags_size, 0))
+        if tags_size > budget or (len(child) == 0 and not child.text):
+            element.remove(child)
+        budget = 0
+
+
+class HTMLSanitizer:
+    """Clean the HTML of an article body for feeds.
+
+    Scripts, ads and other dropped tags are removed, unknown tags are
+    replaced by their content and only allowlisted attributes are kept. Lazy
+    loaded images get their real url as ``src``, urls are made absolute,
+    whitespace is collapsed (except in ``<pre>``) and elements left empty
+    are removed.
+    """
+
+    def __init__(
+        self,
+        allowed_tags=ALLOWED_TAGS,
+        dropped_tags=DROPPED_TAGS,
+        empty_tags=EMPTY_TAGS,
+    ):
+        self.allowed_tags = allowed_tags
+        self.dropped_tags = dropped_tags
+        self.empty_tags = empty_tags
+
+    def __call__(self, markup, base_url=None):
+        # Wrapped, rich context may not have a single root element
+        wrapper = html.fragment_fromstring(markup, create_parent="div")
+        etree.strip_elements(wrapper, *self.dropped_tags, with_tail=False)
+        for element in AD_CONTAINERS(wrapper, pattern=AD_PATTERN):
+            if element.getparent() is not None:  # Not in a removed ad already
+                element.drop_tree()
+        for image in wrapper.iter("img"):
+            self._load_lazy_image(image)
+        if base_url is not None:
+            wrapper.make_links_absolute(base_url, resolve_base_href=False)
+
+        for element in list(wrapper.iterdescendants()):
+            allowed_attributes = self.allowed_tags.get(element.tag)
+            if allowed_attributes is None:
+                element.drop_tag()
+                continue
+            for name, value in element.attrib.items():
+                if name not in allowed_attributes or (
+                    name in URL_ATTRIBUTES
+                    and value.strip().lower().startswith("javascript:")
+                ):
+                    del element.attrib[name]
+            if element.tag == "img" and not element.get("src"):
+                element.drop_tree()
+
+        self._collapse_whitespace(wrapper)
+        # Children before their parents, so emptied parents are removed too
+        for element in reversed(list(wrapper.iterdescendants())):
+            if (
+                element.tag not in self.empty_tags
+                and len(element) == 0
+                and not (element.text or "").strip()
+            ):
+                element.drop_tag()
+
+        return _inner_html(wrapper)
+
+    @staticmethod
+    def _load_lazy_image(image):
+        # `src` is a placeholder when a lazy loading attribute is set
+        for name in LAZY_SRC_ATTRIBUTES:
+            lazy_src = image.get(name)
+            if lazy_src:
+                image.set("src", lazy_src)
+                return
+
+    @staticmethod
+    def _collapse_whitespace(wrapper):
+        preformatted = {
+            element for pre in wrapper.iter("pre") for element in pre.iter()
+        }
+        for element in wrapper.iter():
+            text = element.text
+            if text and element not in preformatted:
+                if text.isspace() and len(element) and element[0].tag in BLOCK_TAGS:
+                    element.text = None
+                else:
+                    element.text = WHITESPACE.sub(" ", text)
+            tail = element.tail
+            if tail and element.getparent() not in preformatted:
+                following = element.getnext()
+                if tail.isspace() and (
+                    element.tag in BLOCK_TAGS
+                    or (following is not None and following.tag in BLOCK_TAGS)
+                ):
+                    element.tail = None
+                else:
+                    element.tail = WHITESPACE.sub(" ", tail)
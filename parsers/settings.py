@@ -18,9 +18,12 @@ USER_AGENT = None
 
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
+# Seconds a parsed robots.txt is reused by later crawls of the same process
+ROBOTSTXT_CACHE_TTL = 24 * 60 * 60
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-# CONCURRENT_REQUESTS = 32
+# Per-slot concurrency is tuned by AdaptiveConcurrencyMiddleware below
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -50,24 +53,164 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'parsers.middlewares.NewsDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+    #    'parsers.middlewares.NewsDownloaderMiddleware': 543,
+    "scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware": None,
+    "parsers.middlewares.SharedRobotsTxtMiddleware": 100,
+    # Between RetryMiddleware (550) and AjaxCrawlMiddleware (560)
+    "parsers.middlewares.ConditionalRequestMiddleware": 555,
+    # Next to the downloader, sees 429/503 before RetryMiddleware retries them
+    "parsers.middlewares.AdaptiveConcurrencyMiddleware": 950,
+}
+
+# Download slot per kind of request, first matching pattern wins. Each slot
+# starts at `start_concurrency` and grows up to `max_concurrency` while the
+# moving average latency stays under `target_latency` seconds.
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_SLOTS = {
+    "image": {
+        "pattern": r"^https?://img\.appledaily\.com\.tw/",
+        "start_concurrency": 8,
+        "max_concurrency": 32,
+        "target_latency": 1.0,
+    },
+    "archive": {
+        "pattern": r"/archive/",
+        "start_concurrency": 1,
+        "max_concurrency": 2,
+        "target_latency": 5.0,
+    },
+    "article": {
+        "pattern": r"",
+        "start_concurrency": 4,
+        "max_concurrency": 16,
+        "target_latency": 2.0,
+    },
+}
+# Longest download delay set on a rate limited (429/503) slot
+ADAPTIVE_CONCURRENCY_MAX_DELAY = 30
+
+# Keep HTTP connections open across crawls of one process
+DOWNLOAD_HANDLERS = {
+    "http": "parsers.handlers.SharedPoolDownloadHandler",
+    "https": "parsers.handlers.SharedPoolDownloadHandler",
+}
+
+# `scrapy daemon` starts a run every DAEMON_INTERVAL seconds (or right after
+# the previous one when it took longer) and appends a JSON line with the
+# latency of each run to DAEMON_REPORT_PATH
+DAEMON_INTERVAL = 10 * 60
+DAEMON_REPORT_PATH = None  # e.g. "runs.jsonl"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    'scrapy.extensions.telnet.TelnetConsole': None,
-# }
+EXTENSIONS = {
+    #    'scrapy.extensions.telnet.TelnetConsole': None,
+    "parsers.extensions.JobStateExtension": 100,
+    "parsers.metrics.MetricsExtension": 500,
+}
+
+# Persist the request queue and the exported items in this directory, one per
+# crawl, e.g. `-s JOBDIR=crawls/backfill`. A crawl stopped with Ctrl-C or
+# killed resumes where it stopped when started again with the same JOBDIR.
+# JOBDIR = None
+
+# Per-stage timings are kept in the stats as timing/<stage>/{count,seconds,
+# max_seconds}. Also write all stats to these files when the spider closes.
+METRICS_ENABLED = True
+METRICS_PROMETHEUS_PATH = None  # e.g. "metrics.prom"
+METRICS_JSON_PATH = None  # e.g. "metrics.json"
+# Profile one crawl with "cprofile" or "pyinstrument" (needs pyinstrument),
+# saved to PROFILER_OUTPUT + ".prof" / ".html" (default: <spider>.profile)
+PROFILER = None
+PROFILER_OUTPUT = None
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
+    # "parsers.pipelines.ValidationPipeline": 100,
+    "parsers.pipelines.SanitizePipeline": 150,
+    "parsers.pipelines.ChangeDetectionPipeline": 200,
+    "parsers.pipelines.NearDuplicatePipeline": 250,
     "parsers.pipelines.RSSPipeline": 300,
+    "parsers.pipelines.ArchivePipeline": 400,
+    "parsers.pipelines.SearchPipeline": 450,
     # "parsers.pipelines.CouchDBPipeline": 800,
 }
 
+# Number of items RSSExporter keeps in memory before spilling a sorted run
+# to a temporary file, or earlier once their text takes RSS_EXPORT_BUFFER_BYTES
+RSS_EXPORT_BUFFER_SIZE = 1000
+RSS_EXPORT_BUFFER_BYTES = 32 * 1024 * 1024
+# Files written for each feed, from one pass over its items: "xml" (RSS),
+# "slim.xml" (RSS with summaries only), "atom.xml" and "json" (JSON Feed).
+# Append ".gz" or ".br" (needs brotli) to write a precompressed copy.
+RSS_OUTPUTS = ["xml", "xml.gz", "slim.xml", "slim.xml.gz", "atom.xml", "json"]
+
+# Extract articles in this many worker processes instead of on the reactor
+# thread, 0 to extract inline. At most EXTRACTION_QUEUE_SIZE pages (default
+# twice the workers) wait in the pool, further article responses wait for a
+# free place.
+EXTRACTION_WORKERS = 0
+EXTRACTION_QUEUE_SIZE = None
+
+# Bound the memory of a crawl. Responses over DOWNLOAD_MAXSIZE bytes are
+# dropped (a warning is logged over DOWNLOAD_WARNSIZE). With SanitizePipeline
+# enabled, rich context is cut to RICH_CONTEXT_MAX_BYTES once sanitized (0: no
+# limit); without it rich context is kept whole.
+DOWNLOAD_MAXSIZE = 16 * 1024 * 1024
+DOWNLOAD_WARNSIZE = 4 * 1024 * 1024
+RICH_CONTEXT_MAX_BYTES = 256 * 1024
+
+# Persistent cache of image url -> (length, type), used for RSS enclosures
+ENCLOSURE_CACHE_PATH = "enclosures.sqlite"
+
+# Revalidate article pages crawled before and reuse their parsed article when
+# the site answers 304 Not Modified
+CONDITIONAL_CACHE_ENABLED = True
+CONDITIONAL_CACHE_PATH = "fingerprints.sqlite"
+
+# Merge new articles into the existing feed instead of rebuilding it, articles
+# already in the feed are not requested again unless RSS_INCREMENTAL_SKIP_KNOWN
+# is off. Needs "xml" in RSS_OUTPUTS; full items are kept next to each feed in
+# `<feed>.items.jsonl` to be merged by the next crawl. Also enables
+# ChangeDetectionPipeline, which drops re-crawled articles whose content hash
+# in CHANGE_DETECTION_PATH is unchanged and sets `updated_at` on changed ones.
+RSS_INCREMENTAL = False
+RSS_INCREMENTAL_SKIP_KNOWN = True
+CHANGE_DETECTION_PATH = "contents.sqlite"
+# Keep at most this many items / items published in this many days (0: no limit)
+RSS_MAX_ITEMS = 0
+RSS_MAX_AGE_DAYS = 0
+
+# Drop articles at least this similar (estimated Jaccard similarity of their
+# tokens, 0-1) to an article kept before under another url. Signatures of kept
+# articles are in NEAR_DUPLICATE_PATH, compared with only when RSS_INCREMENTAL
+# is on: a rebuilt feed only has the articles of its crawl.
+NEAR_DUPLICATE_ENABLED = False
+NEAR_DUPLICATE_SIMILARITY = 0.7
+NEAR_DUPLICATE_PATH = "minhashes.sqlite"
+
+# Directory of the article archives, one per spider, partitioned by date and
+# category, with the full-text index of SearchPipeline (SEARCH_ENABLED, needs
+# ARCHIVE_ENABLED too)
+ARCHIVE_ENABLED = False
+SEARCH_ENABLED = False
+ARCHIVE_PATH = "archive"
+
+# Custom commands, `scrapy feed`, `scrapy search`, `scrapy crawlall` and
+# `scrapy daemon`
+COMMANDS_MODULE = "parsers.commands"
+
+# CouchDBExporter writes through _bulk_docs once this many articles are buffered
+# or this many seconds have passed since the last write
+COUCHDB_BATCH_SIZE = 100
+COUCHDB_BATCH_INTERVAL = 10
+# Number of batches CouchDBPipeline writes in parallel, off the reactor thread
+COUCHDB_CONCURRENCY = 4
+
 # Enable and configure the AutoThrottle extension (disabled by default)
+# Keep it disabled with AdaptiveConcurrencyMiddleware, both set slot delays
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
 # AUTOTHROTTLE_ENABLED = True
 # The initial download delay
@@ -88,5 +231,8 @@ ITEM_PIPELINES = {
 # HTTPCACHE_IGNORE_HTTP_CODES = []
 # HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
 
+# Log unchanged articles dropped by ChangeDetectionPipeline at DEBUG
+LOG_FORMATTER = "parsers.logformatter.LogFormatter"
+
 # Export JSON in UTF-8
 FEED_EXPORT_ENCODING = "utf-8"
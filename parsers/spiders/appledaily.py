@@ -1,8 +1,5 @@
-from datetime import datetime, timedelta
-
-import scrapy
-from parsers.items import Article, Author, Category, Image
-from pytz import timezone
+from parsers.items import Image
+from parsers.spiders.archive import ArchiveSpider, SiteConfig
 
 TIMEZONE = "Asia/Taipei"
 CATEGORIES = {
@@ -17,102 +14,43 @@ CATEGORIES = {
 }
 
 
-class AppleDailySpider(scrapy.Spider):
+class AppleDailySpider(ArchiveSpider):
     name = "appledaily"
-    allowed_domains = ["tw.appledaily.com"]
-    metadata = {  # Custom, used in pipeline
-        "category": "News",
-        "copyright": "© 2020 APPLE ONLINE All rights reserved. 蘋果新聞網 版權所有 不得轉載",
-        "description": "提供全面新聞資訊、即時分析，全天候報道本地及全球新聞。",
-        "image": Image(
-            url="https://img.appledaily.com.tw/appledaily/images/fbshare/appledaily_fb_600x315.png",
-            title="蘋果新聞網",
-            link="https://tw.appledaily.com",
-            width=600,
-            height=315,
-            description="提供全面新聞資訊、即時分析，全天候報道本地及全球新聞。",
-        ),
-        "language": "zh-tw",
-        "link": "https://tw.appledaily.com",
-        "title": "蘋果新聞網",
-    }
-
-    def __init__(self, date=None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        if date is None:
-            self.start_urls = ["https://tw.appledaily.com/archive/"]
-            self.crawl_one_more_page = True
-            self.file_name = "appledaily"
-        else:
-            self.start_urls = [f"https://tw.appledaily.com/archive/{date}/"]
-            self.crawl_one_more_page = False
-            self.file_name = f"appledaily_{date}"  # Custom, used in pipeline
-
-    def parse(self, response, **kwargs):
-        news_links = response.xpath("//*[@id='section-body']/div/a")
-        yield from response.follow_all(news_links, self.parse_news)
-        if self.crawl_one_more_page:
-            one_day_before = datetime.strptime(
-                response.xpath(
-                    "//*[@id='section-body']/div[2]/div[2]/span/text()"
-                ).get(),
-                "%Y.%m.%d",
-            ) - timedelta(days=1)
-            self.crawl_one_more_page = False
-            yield scrapy.Request(
-                f"https://tw.appledaily.com/archive/{one_day_before.strftime('%Y%m%d')}/"
-            )
-
-    def parse_news(self, response):
-        url = response.url
-        context_selector = response.xpath("//*[@id='articleBody']/section[2]/p")
-        author = context_selector.re_first(r"【(.*)】")
-        image_url = response.xpath("/html/head/meta[@property='og:image']").attrib[
-            "content"
-        ]
-
-        item = Article(
-            id=url.split("/")[-2],
-            url=url,
-            title=response.xpath(
-                "//*[@id='article-header']/header/div/h1/span/text()"
-            ).get(),
-            summary="".join(
-                response.xpath(
-                    "//*[@id='articleBody']/section[2]/p[1]/descendant-or-self::*/text()"
-                ).getall()
+    site = SiteConfig(
+        metadata={
+            "category": "News",
+            "copyright": "© 2020 APPLE ONLINE All rights reserved. 蘋果新聞網 版權所有 不得轉載",
+            "description": "提供全面新聞資訊、即時分析，全天候報道本地及全球新聞。",
+            "image": Image(
+                url="https://img.appledaily.com.tw/appledaily/images/fbshare/appledaily_fb_600x315.png",
+                title="蘋果新聞網",
+                link="https://tw.appledaily.com",
+                width=600,
+                height=315,
+                description="提供全面新聞資訊、即時分析，全天候報道本地及全球新聞。",
             ),
-            context="\n".join(
-                [
-                    "".join(sel.xpath("descendant-or-self::*/text()").getall())
-                    for sel in context_selector
-                ],
-            ),
-            rich_context=response.xpath("//*[@id='article-body']/self::node()").get(),
-            author=[Author(name=author)] if author else [],
-            image=Image(
-                url=image_url,
-                type=response.xpath(
-                    "/html/head/meta[@property='og:image:type']"
-                ).attrib["content"],
-            ),
-            category=[Category(name=CATEGORIES.get(url.split("/")[-4]))],
-            timestamp=datetime.strptime(
-                response.xpath("//*[@id='article-header']/div/div/text()").getall()[1],
-                "%Y/%m/%d %H:%M",
-            ).astimezone(timezone(TIMEZONE)),
-            third_party=context_selector.re_first(r"本文由(.*)提供"),
-            subtitle=response.xpath(
-                "//*[@id='article-header']/header/p/span/text()"
-            ).get(),
-        )
-
-        yield scrapy.Request(
-            image_url,
-            callback=self.parse_news_image,
-            cb_kwargs={"item": item},
-        )
-
-    def parse_news_image(self, response, item):
-        item.image.length = str(len(response.body))
-        yield item
+            "language": "zh-tw",
+            "link": "https://tw.appledaily.com",
+            "title": "蘋果新聞網",
+        },
+        timezone=TIMEZONE,
+        archive_url="https://tw.appledaily.com/archive/{date}/",
+        latest_archive_url="https://tw.appledaily.com/archive/",
+        allowed_domains=["tw.appledaily.com", "img.appledaily.com.tw"],
+        article_links="//*[@id='section-body']/div/a/@href",
+        archive_date="//*[@id='section-body']/div[2]/div[2]/span/text()",
+        archive_date_format="%Y.%m.%d",
+        title="//*[@id='article-header']/header/div/h1/span/text()",
+        subtitle="//*[@id='article-header']/header/p/span/text()",
+        paragraphs="//*[@id='articleBody']/section[2]/p",
+        article_body="//*[@id='article-body']",
+        image_url="/html/head/meta[@property='og:image']/@content",
+        image_type="/html/head/meta[@property='og:image:type']/@content",
+        published_at="(//*[@id='article-header']/div/div/text())[2]",
+        published_at_format="%Y/%m/%d %H:%M",
+        author_pattern=r"【(.*)】",
+        third_party_pattern=r"本文由(.*)提供",
+        id_pattern=r"/([^/]+)/$",
+        category_pattern=r"^https?://[^/]+/([^/]+)/",
+        categories=CATEGORIES,
+    )
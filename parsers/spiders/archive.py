@@ -0,0 +1,336 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import scrapy
+from parsers.extractors import ArticleExtractor, ExtractionPool
+from parsers.items import Article, Author, Category, Image
+from parsers.metrics import record_time, timed
+from parsers.stores import EnclosureStore
+from pytz import timezone
+from scrapy import signals
+from scrapy.exceptions import StopDownload
+from scrapy.selector import Selector
+
+
+@dataclass
+class SiteConfig:
+    """Everything site specific an `ArchiveSpider` needs.
+
+    Selectors are XPaths, those of articles are evaluated on the lxml tree of
+    the page. Patterns are regexes whose first group is the wanted value.
+    """
+
+    metadata: dict  # RSS channel elements, used in pipeline
+    timezone: str
+    # Archive page listing the articles of a date, `{date}` formatted with
+    # `archive_url_date_format`, and the archive page of the latest date
+    archive_url: str
+    latest_archive_url: str
+    archive_url_date_format: str = "%Y%m%d"
+    allowed_domains: List[str] = field(default_factory=list)
+
+    # Archive page
+    article_links: str = ""
+    archive_date: Optional[str] = None  # Date shown on the archive page
+    archive_date_format: Optional[str] = None
+
+    # Article page
+    title: Optional[str] = None
+    subtitle: Optional[str] = None
+    paragraphs: Optional[str] = None
+    article_body: Optional[str] = None  # Element kept as rich context
+    image_url: Optional[str] = None
+    image_type: Optional[str] = None
+    published_at: Optional[str] = None
+    published_at_format: str = "%Y/%m/%d %H:%M"
+    author_pattern: Optional[str] = None  # Searched in paragraphs
+    third_party_pattern: Optional[str] = None  # Searched in paragraphs
+    # Third party name -> its RSS feed, RSS items credit known ones in <source>
+    source_feeds: Dict[str, str] = field(default_factory=dict)
+
+    # Article url
+    id_pattern: Optional[str] = None
+    category_pattern: Optional[str] = None  # Category slug
+    categories: Dict[str, str] = field(default_factory=dict)  # Slug -> name
+
+
+def _parse_date(name, value):
+    try:
+        return datetime.strptime(value, "%Y%m%d").date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYYMMDD, got {value!r}")
+
+
+class ArchiveSpider(scrapy.Spider):
+    # Crawl the archive pages of a site and the articles they link to.
+    # Subclasses only set `name` and `site`.
+    site: SiteConfig = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.site is not None:
+            cls.allowed_domains = cls.site.allowed_domains
+            cls.metadata = cls.site.metadata  # Custom, used in pipeline
+            cls.extract_article = staticmethod(ArticleExtractor(cls.site))
+            cls.id_pattern = cls.site.id_pattern and re.compile(cls.site.id_pattern)
+            cls.category_pattern = cls.site.category_pattern and re.compile(
+                cls.site.category_pattern
+            )
+
+    def __init__(
+        self, date=None, start=None, end=None, days=None, split=None, *args, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.timezone = timezone(self.site.timezone)
+        self.known_urls = set()  # Custom, filled by pipeline in incremental mode
+        self.split_by_date = str(split).lower() in ("1", "true", "yes")
+        if date is not None and (start, end, days) != (None, None, None):
+            raise ValueError("date can't be combined with start, end or days")
+        if start is not None and days is not None:
+            raise ValueError("start and days can't be combined, use start and end")
+        if end is not None and start is None and days is None:
+            raise ValueError("end needs start or days to make a date range")
+        today = datetime.now(self.timezone).date()
+        if start is not None or days is not None:
+            # Date range, newest first
+            end_date = _parse_date("end", end) if end is not None else today
+            if end_date > today:
+                raise ValueError(f"end {end} is in the future, archives end today")
+            if start is not None:
+                start_date = _parse_date("start", start)
+            else:
+                try:
+                    days = int(days)
+                except ValueError:
+                    raise ValueError(f"days must be a number, got {days!r}")
+                if days < 1:
+                    raise ValueError(f"days must be at least 1, got {days}")
+                start_date = end_date - timedelta(days=days - 1)
+            if start_date > end_date:
+                raise ValueError(f"start {start} is after end {end_date:%Y%m%d}")
+            dates = [
+                end_date - timedelta(days=offset)
+                for offset in range((end_date - start_date).days + 1)
+            ]
+            self.start_urls = [self._archive_url(date) for date in dates]
+            self.crawl_one_more_page = False
+            self.file_name = f"{self.name}_{dates[-1]:%Y%m%d}_{dates[0]:%Y%m%d}"
+            self.file_names = (  # Custom, used in pipeline
+                [f"{self.name}_{date:%Y%m%d}" for date in dates]
+                if self.split_by_date
+                else [self.file_name]
+            )
+            self.crawl_date = end_date
+        elif date is None:
+            self.start_urls = [self.site.latest_archive_url]
+            self.crawl_one_more_page = self.site.archive_date is not None
+            self.file_name = self.name
+            self.file_names = [] if self.split_by_date else [self.file_name]
+            self.crawl_date = today
+        else:
+            self.crawl_date = _parse_date("date", date)
+            if self.crawl_date > today:
+                raise ValueError(f"date {date} is in the future, archives end today")
+            self.start_urls = [self._archive_url(self.crawl_date)]
+            self.crawl_one_more_page = False
+            self.file_name = f"{self.name}_{date}"  # Custom, used in pipeline
+            self.file_names = [self.file_name]
+
+    def _archive_url(self, date):
+        return self.site.archive_url.format(
+            date=date.strftime(self.site.archive_url_date_format)
+        )
+
+    def get_file_name(self, item):
+        # Custom, feed the item is exported to
+        if not self.split_by_date:
+            return self.file_name
+        if item.timestamp is None:
+            # Undated, in the feed of the newest date crawled
+            return f"{self.name}_{self.crawl_date:%Y%m%d}"
+        date = item.timestamp.astimezone(self.timezone)
+        return f"{self.name}_{date.strftime('%Y%m%d')}"
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.enclosures = EnclosureStore(crawler.settings["ENCLOSURE_CACHE_PATH"])
+        crawler.signals.connect(spider.enclosures.close, signal=signals.spider_closed)
+        crawler.signals.connect(
+            spider.headers_received, signal=signals.headers_received
+        )
+        workers = crawler.settings.getint("EXTRACTION_WORKERS")
+        if workers > 0:
+            spider.extraction_pool = ExtractionPool(
+                spider.site,
+                workers,
+                crawler.settings.getint("EXTRACTION_QUEUE_SIZE") or 2 * workers,
+            )
+            crawler.signals.connect(
+                spider.extraction_pool.close, signal=signals.spider_closed
+            )
+        else:
+            spider.extraction_pool = None
+        return spider
+
+    def start_requests(self):
+        # Schedule every archive page at once, newer dates first
+        for priority, url in enumerate(self.start_urls):
+            yield scrapy.Request(url, priority=-priority, dont_filter=True)
+
+    def parse(self, response, **kwargs):
+        with timed(self.crawler.stats, "parse_archive", self):
+            news_links = [
+                response.urljoin(href)
+                for href in response.xpath(self.site.article_links).getall()
+            ]
+        yield from response.follow_all(
+            [link for link in news_links if link not in self.known_urls],
+            self.parse_news if self.extraction_pool is None else self.parse_news_pooled,
+            priority=response.request.priority,
+        )
+        if self.crawl_one_more_page:
+            one_day_before = datetime.strptime(
+                response.xpath(self.site.archive_date).get().strip(),
+                self.site.archive_date_format,
+            ) - timedelta(days=1)
+            self.crawl_one_more_page = False
+            yield scrapy.Request(
+                self._archive_url(one_day_before),
+                priority=response.request.priority - 1,
+            )
+
+    def parse_news(self, response):
+        if response.status == 304:
+            # Not modified since last crawl, replay the article parsed then
+            yield Article.from_dict(response.meta["cached_item"])
+            return
+
+        with timed(self.crawler.stats, "extract", self):
+            # Not `response.selector`, cached on the response: the tree is
+            # freed once extracted, not when the scraper releases the response
+            # after its items went through the pipelines
+            fields = self.extract_article(Selector(response).root)
+        yield from self._parse_fields(response, fields)
+
+    async def parse_news_pooled(self, response):
+        # `parse_news` with the extraction done in the extraction pool
+        if response.status == 304:
+            yield Article.from_dict(response.meta["cached_item"])
+            return
+
+        # Includes the wait for a free place in the pool
+        start = perf_counter()
+        fields = await self.extraction_pool.extract(response.text)
+        record_time(self.crawler.stats, "extract_pooled", perf_counter() - start, self)
+        for request_or_item in self._parse_fields(response, fields):
+            yield request_or_item
+
+    def _parse_fields(self, response, fields):
+        image_url = fields["image_url"]
+        with timed(self.crawler.stats, "build_article", self):
+            item = self.build_article(response.url, fields)
+
+        # No image, or enclosure length is known, no need to request the image
+        if image_url is None:
+            yield item
+            return
+        enclosure = self.enclosures.get(image_url)
+        if enclosure is not None:
+            self._set_image_size(item, *enclosure)
+            yield item
+            return
+
+        yield scrapy.Request(
+            image_url,
+            method="HEAD",
+            priority=response.request.priority,
+            callback=self.parse_news_image,
+            cb_kwargs={"item": item},
+            meta={"handle_httpstatus_list": [405, 501]},
+            dont_filter=True,  # Image may be shared between articles
+        )
+
+    def build_article(self, url, fields):
+        # Override to handle fields the config can't express
+        kwargs = {}
+        match = self.id_pattern and self.id_pattern.search(url)
+        if match:
+            kwargs["id"] = match.group(1)
+        match = self.category_pattern and self.category_pattern.search(url)
+        category = match and self.site.categories.get(match.group(1))
+        return Article(
+            url=url,
+            title=fields["title"],
+            summary=fields["summary"],
+            context=fields["context"],
+            rich_context=fields["rich_context"],
+            author=[Author(name=fields["author"])] if fields["author"] else [],
+            image=(
+                Image(url=fields["image_url"], type=fields["image_type"])
+                if fields["image_url"]
+                else None
+            ),
+            category=[Category(name=category)] if category else [],
+            timestamp=(
+                self.timezone.localize(
+                    datetime.strptime(
+                        fields["published_at"].strip(), self.site.published_at_format
+                    )
+                )
+                if fields["published_at"]
+                else None
+            ),
+            third_party=fields["third_party"],
+            subtitle=fields["subtitle"],
+            **kwargs,
+        )
+
+    def parse_news_image(self, response, item):
+        length = response.headers.get("Content-Length")
+        if response.status != 200 or length is None:
+            # HEAD not supported, ask for the first byte only
+            yield response.request.replace(
+                method="GET",
+                headers={"Range": "bytes=0-0"},
+                callback=self.parse_news_image_range,
+                meta={},
+            )
+            return
+        self._save_image_size(item, int(length), response.headers.get("Content-Type"))
+        yield item
+
+    def headers_received(self, headers, body_length, request, spider):
+        # Only the headers of the first byte of an image are needed. When the
+        # server ignores Range, don't download the whole image.
+        if request.callback == self.parse_news_image_range and (
+            b"Content-Range" in headers or b"Content-Length" in headers
+        ):
+            raise StopDownload(fail=False)
+
+    def parse_news_image_range(self, response, item):
+        content_range = response.headers.get("Content-Range")  # bytes 0-0/12345
+        content_length = response.headers.get("Content-Length")
+        if content_range is not None and not content_range.endswith(b"*"):
+            length = int(content_range.rsplit(b"/", 1)[-1])
+        elif response.status == 200 and content_length is not None:
+            # Range ignored by server, download stopped at the headers
+            length = int(content_length)
+        else:
+            # Whole image downloaded
+            length = len(response.body)
+        self._save_image_size(item, length, response.headers.get("Content-Type"))
+        yield item
+
+    def _save_image_size(self, item, length, content_type):
+        if content_type is not None:
+            content_type = content_type.decode("latin-1")
+        self.enclosures.set(item.image.url, length, content_type)
+        self._set_image_size(item, length, content_type)
+
+    def _set_image_size(self, item, length, content_type):
+        item.image.length = length
+        item.image.type = item.image.type or content_type
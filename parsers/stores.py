@@ -0,0 +1,486 @@
+import functools
+import hashlib
+import json
+import operator
+import os
+import re
+import sqlite3
+import unicodedata
+import zlib
+from array import array
+from dataclasses import asdict
+from datetime import datetime
+
+from parsers.items import Article
+
+# Database path -> [connection, number of stores using it]
+_connections = {}
+
+
+def _connect(path):
+    # Crawlers running in one process share the connection to a database, so
+    # their uncommitted writes don't lock each other out
+    if path == ":memory:":
+        return sqlite3.connect(path)
+    path = os.path.abspath(path)
+    if path not in _connections:
+        _connections[path] = [sqlite3.connect(path), 0]
+    _connections[path][1] += 1
+    return _connections[path][0]
+
+
+def _disconnect(db):
+    db.commit()
+    for path, entry in _connections.items():
+        if entry[0] is db:
+            entry[1] -= 1
+            if entry[1]:
+                return
+            del _connections[path]
+            break
+    db.close()
+
+
+class EnclosureStore:
+    """Persistent cache of enclosure url -> (length, type)."""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS enclosures"
+            " (url TEXT PRIMARY KEY, length INTEGER, type TEXT)"
+        )
+
+    def get(self, url):
+        return self.db.execute(
+            "SELECT length, type FROM enclosures WHERE url = ?", (url,)
+        ).fetchone()
+
+    def set(self, url, length, type):
+        self.db.execute(
+            "INSERT OR REPLACE INTO enclosures VALUES (?, ?, ?)", (url, length, type)
+        )
+
+    def close(self):
+        _disconnect(self.db)
+
+
+class ContentHashStore:
+    """Persistent hash of article contents per feed and when they last changed."""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS feed_contents (feed TEXT, url TEXT,"
+            " hash INTEGER, updated_at TEXT, PRIMARY KEY (feed, url))"
+        )
+
+    def get(self, feed, url):
+        return self.db.execute(
+            "SELECT hash, updated_at FROM feed_contents WHERE feed = ? AND url = ?",
+            (feed, url),
+        ).fetchone()
+
+    def set(self, feed, url, hash, updated_at):
+        self.db.execute(
+            "INSERT OR REPLACE INTO feed_contents VALUES (?, ?, ?, ?)",
+            (feed, url, hash, updated_at),
+        )
+
+    def close(self):
+        _disconnect(self.db)
+
+
+class FingerprintStore:
+    """Persistent validators (ETag, Last-Modified) and parsed item of pages."""
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages"
+            " (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, item BLOB)"
+        )
+
+    def get(self, url):
+        return self.db.execute(
+            "SELECT etag, last_modified, item FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+
+    def set(self, url, etag, last_modified, item):
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+            (url, etag, last_modified, item),
+        )
+
+    def close(self):
+        _disconnect(self.db)
+
+
+class ArchiveStore:
+    """Articles partitioned by date and category, with an index of their place.
+
+    Articles are appended as JSON lines to ``<path>/<date>/<category>.jsonl``.
+    ``<path>/index.sqlite`` maps each guid to its partition and byte offset,
+    so queries read only the matching records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.db = _connect(os.path.join(path, "index.sqlite"))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS articles (guid TEXT PRIMARY KEY,"
+            " date TEXT, category TEXT, timestamp TEXT, offset INTEGER, length INTEGER)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS articles_date ON articles (date, timestamp)"
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS articles_category"
+            " ON articles (category, date, timestamp)"
+        )
+        self.partitions = {}  # (date, category) -> file open for appending
+
+    def _partition_path(self, date, category):
+        # Category names are used as file names, keep them inside the archive
+        category = category.replace(os.sep, "_") or "_"
+        return os.path.join(self.path, date, f"{category}.jsonl")
+
+    def _open_partition(self, date, category):
+        key = (date, category)
+        if key not in self.partitions:
+            path = self._partition_path(date, category)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.partitions[key] = open(path, "ab")
+        return self.partitions[key]
+
+    def add(self, item):
+        """Append ``item``, unless the archive already has the same record."""
+        date = item.timestamp.date().isoformat() if item.timestamp else ""
+        category = (item.category[0].name if item.category else None) or ""
+        record = (
+            json.dumps(asdict(item), ensure_ascii=False, default=str).encode() + b"\n"
+        )
+        row = self.db.execute(
+            "SELECT date, category, offset, length FROM articles WHERE guid = ?",
+            (item.url,),
+        ).fetchone()
+        if row is not None and self._content(self._read(*row)) == self._content(record):
+            return False
+
+        # Records are never rewritten, an updated article is appended again
+        file = self._open_partition(date, category)
+        offset = file.tell()
+        file.write(record)
+        self.db.execute(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                item.url,
+                date,
+                category,
+                item.timestamp.isoformat() if item.timestamp else "",
+                offset,
+                len(record),
+            ),
+        )
+        return True
+
+    def _read(self, date, category, offset, length):
+        partition = self.partitions.get((date, category))
+        if partition is not None:
+            partition.flush()
+        with open(self._partition_path(date, category), "rb") as file:
+            file.seek(offset)
+            return file.read(length)
+
+    @staticmethod
+    def _content(record):
+        # Ids of articles, authors and categories are random unless the site
+        # gives them, a re-crawled article only differs from its record by them
+        data = json.loads(record)
+        data["id"] = None
+        for name in ("author", "category"):
+            data[name] = [{**value, "id": None} for value in data[name]]
+        return data
+
+    @staticmethod
+    def _load(record):
+        data = json.loads(record)
+        for name in ("timestamp", "updated_at"):
+            if data[name] is not None:
+                data[name] = datetime.fromisoformat(data[name])
+        return Article.from_dict(data)
+
+    def get(self, guid):
+        row = self.db.execute(
+            "SELECT date, category, offset, length FROM articles WHERE guid = ?",
+            (guid,),
+        ).fetchone()
+        return self._load(self._read(*row)) if row is not None else None
+
+    def query(self, start=None, end=None, category=None, limit=None):
+        """Yield articles published from ``start`` to ``end`` (inclusive
+        ``datetime.date``), in ``category`` if given, newest first."""
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start.isoformat())
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(end.isoformat())
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.db.execute(
+            "SELECT date, category, offset, length FROM articles"
+            f"{where} ORDER BY date DESC, timestamp DESC LIMIT ?",
+            (*params, -1 if limit is None else limit),
+        ).fetchall()
+
+        for partition in self.partitions.values():
+            partition.flush()
+        # Rows come date by date, only one date's partitions are open at once
+        files = {}
+        try:
+            for date, category, offset, length in rows:
+                if (date, category) not in files:
+                    if any(key[0] != date for key in files):
+                        for file in files.values():
+                            file.close()
+                        files = {}
+                    files[date, category] = open(
+                        self._partition_path(date, category), "rb"
+                    )
+                file = files[date, category]
+                file.seek(offset)
+                yield self._load(file.read(length))
+        finally:
+            for file in files.values():
+                file.close()
+
+    def close(self):
+        for partition in self.partitions.values():
+            partition.close()
+        self.partitions = {}
+        _disconnect(self.db)
+
+
+# Runs of CJK characters (first group), and words of other letters and digits
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+
+
+@functools.cache
+def _token_runs():
+    # Compiled on first use, the CJK ranges take milliseconds to compile
+    return re.compile(f"([{_CJK}]+)|([^\\W{_CJK}]+)")
+
+
+def _search_tokens(text):
+    # CJK text has no word boundaries, index every two adjacent characters
+    tokens = []
+    for cjk, word in _token_runs().findall(unicodedata.normalize("NFKC", text).lower()):
+        if len(cjk) > 1:
+            tokens.extend(map(operator.add, cjk, cjk[1:]))
+        else:
+            tokens.append(cjk or word)
+    return tokens
+
+
+class SearchIndex:
+    """Full-text index of article title, summary and context.
+
+    CJK text is indexed as overlapping character bigrams, a query word
+    matches when all its bigrams are adjacent, in order. Rows get ids ordered
+    by publication time, so matches come newest first and a query stops once
+    it has ``limit`` of them. The FTS5 table keeps no content and can't delete
+    rows, an updated article gets a new row and the previous one is unlinked
+    from its guid.
+    """
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search"
+            " USING fts5(title, body, content='', columnsize=0)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS documents"
+            " (id INTEGER PRIMARY KEY, guid TEXT UNIQUE, category TEXT, hash INTEGER)"
+        )
+
+    def add(self, item):
+        """Index ``item``, unless it's indexed already with the same text."""
+        body = item.context or ""
+        if item.summary and item.summary not in body:
+            body = f"{item.summary}\n{body}"
+        category = (item.category[0].name if item.category else None) or ""
+        text_hash = zlib.crc32(f"{item.title}\0{body}\0{category}".encode())
+        row = self.db.execute(
+            "SELECT id, hash FROM documents WHERE guid = ?", (item.url,)
+        ).fetchone()
+        if row is not None:
+            if row[1] == text_hash:
+                return False
+            self.db.execute("UPDATE documents SET guid = NULL WHERE id = ?", (row[0],))
+
+        # Publication time in the high bits, url hash against collisions
+        id = int(item.timestamp.timestamp()) << 20 if item.timestamp else 0
+        id += zlib.crc32(item.url.encode()) & 0xFFFFF
+        while self.db.execute("SELECT 1 FROM documents WHERE id = ?", (id,)).fetchone():
+            id += 1
+        self.db.execute(
+            "INSERT INTO search (rowid, title, body) VALUES (?, ?, ?)",
+            (
+                id,
+                " ".join(_search_tokens(item.title or "")),
+                " ".join(_search_tokens(body)),
+            ),
+        )
+        self.db.execute(
+            "INSERT INTO documents VALUES (?, ?, ?, ?)",
+            (id, item.url, category, text_hash),
+        )
+        return True
+
+    @staticmethod
+    def _match_expression(query):
+        phrases = []
+        for word in query.split():
+            tokens = _search_tokens(word)
+            if not tokens:
+                continue
+            phrase = f'"{" ".join(tokens)}"'
+            if (
+                len(tokens) == 1
+                and len(tokens[0]) == 1
+                and _token_runs().fullmatch(tokens[0]).group(1)
+            ):
+                # Single CJK character, first of a bigram
+                phrase += " *"
+            phrases.append(phrase)
+        return " AND ".join(phrases)
+
+    def search(self, query, category=None, limit=20):
+        """Return guids of articles matching all words of ``query``, in
+        ``category`` if given, newest first."""
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT documents.guid FROM search"
+            " JOIN documents ON documents.id = search.rowid"
+            " WHERE search MATCH ? AND documents.guid IS NOT NULL"
+        )
+        params = [expression]
+        if category is not None:
+            sql += " AND documents.category = ?"
+            params.append(category)
+        sql += " ORDER BY search.rowid DESC LIMIT ?"
+        params.append(-1 if limit is None else limit)
+        return [guid for guid, in self.db.execute(sql, params)]
+
+    def close(self):
+        _disconnect(self.db)
+
+
+class MinHashStore:
+    """MinHash signatures of article contents, with an LSH index of their bands.
+
+    A signature keeps the smallest token hash of each of 64 buckets (one
+    permutation hashing), the share of equal values estimates the Jaccard
+    similarity of two token sets. Signatures are indexed by bands of 4
+    values: contents at least 0.7 similar share a band with a probability
+    above 98%, so lookups only compare the few signatures sharing a band.
+    """
+
+    SLOTS = 64
+    BAND_SIZE = 4
+    # Shorter texts have too few tokens for a meaningful signature
+    MIN_TOKENS = 20
+
+    def __init__(self, path):
+        self.db = _connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS signatures"
+            " (url TEXT PRIMARY KEY, signature BLOB)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS bands (band INTEGER, url TEXT,"
+            " PRIMARY KEY (band, url)) WITHOUT ROWID"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS bands_url ON bands (url)")
+
+    @classmethod
+    def signature(cls, text):
+        """Return the signature of the search tokens of ``text``, None if it
+        has fewer than ``MIN_TOKENS``."""
+        tokens = set(_search_tokens(text))
+        if len(tokens) < cls.MIN_TOKENS:
+            return None
+        empty = 1 << 32
+        slots = [empty] * cls.SLOTS
+        for token in tokens:
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            slot, value = value % cls.SLOTS, value >> 32
+            if value < slots[slot]:
+                slots[slot] = value
+        # Buckets without tokens take the value of the next filled one
+        for slot in range(cls.SLOTS):
+            offset = 1
+            while slots[slot] == empty:
+                slots[slot] = slots[(slot + offset) % cls.SLOTS]
+                offset += 1
+        return array("I", slots).tobytes()
+
+    @staticmethod
+    def similarity(signature, other):
+        values = array("I", signature)
+        return sum(a == b for a, b in zip(values, array("I", other))) / len(values)
+
+    def _bands(self, signature):
+        size = self.BAND_SIZE * 4
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    signature[start : start + size], digest_size=8, salt=bytes([band])
+                ).digest(),
+                "little",
+                signed=True,
+            )
+            for band, start in enumerate(range(0, len(signature), size))
+        ]
+
+    def find(self, signature, min_similarity, exclude=None):
+        """Return (url, similarity) of the most similar signature sharing a
+        band with ``signature``, if at least ``min_similarity``, other than
+        ``exclude``'s."""
+        bands = self._bands(signature)
+        closest = None
+        for url, other in self.db.execute(
+            "SELECT url, signature FROM signatures WHERE url IN (SELECT url FROM"
+            f" bands WHERE band IN ({', '.join('?' * len(bands))}))",
+            bands,
+        ):
+            similarity = self.similarity(signature, other)
+            if (
+                similarity >= min_similarity
+                and url != exclude
+                and (closest is None or similarity > closest[1])
+            ):
+                closest = (url, similarity)
+        return closest
+
+    def set(self, url, signature):
+        self.db.execute("DELETE FROM bands WHERE url = ?", (url,))
+        self.db.execute(
+            "INSERT OR REPLACE INTO signatures VALUES (?, ?)", (url, signature)
+        )
+        self.db.executemany(
+            "INSERT OR IGNORE INTO bands VALUES (?, ?)",
+            [(band, url) for band in self._bands(signature)],
+        )
+
+    def close(self):
+        _disconnect(self.db)
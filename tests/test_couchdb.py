@@ -0,0 +1,63 @@
+import requests
+
+from benchmarks.stubs import CouchDBStub
+from parsers.exporters import CouchDBExporter
+from parsers.items import Article, Image
+
+
+def article(number, title="Title"):
+    return Article(
+        url=f"https://tw.appledaily.com/{number}",
+        title=f"{title} {number}",
+        summary="",
+        context="",
+        rich_context="",
+        id=str(number),
+        image=Image(url=f"https://img.appledaily.com.tw/{number}.jpg"),
+    )
+
+
+def exporter(stub, batch_size, batch_interval=3600):
+    return CouchDBExporter(
+        requests.Session(),
+        stub.url,
+        "articles",
+        batch_size=batch_size,
+        batch_interval=batch_interval,
+    )
+
+
+def test_items_are_written_in_batches():
+    with CouchDBStub() as stub:
+        couchdb = exporter(stub, batch_size=3)
+        couchdb.start_exporting()
+        batches = [couchdb.buffer_item(article(number)) for number in range(7)]
+        assert [len(docs) if docs else 0 for docs in batches] == [0, 0, 3, 0, 0, 3, 0]
+        for docs in batches:
+            if docs:
+                couchdb.write_docs(docs)
+        assert len(stub.docs) == 6
+        couchdb.finish_exporting()
+        assert sorted(stub.docs) == [str(number) for number in range(7)]
+        assert stub.docs["0"]["image"]["url"] == "https://img.appledaily.com.tw/0.jpg"
+
+
+def test_written_documents_are_updated():
+    with CouchDBStub() as stub:
+        couchdb = exporter(stub, batch_size=10)
+        couchdb.export_item(article(1))
+        couchdb.finish_exporting()
+        # Updated twice in one batch, the last copy wins
+        couchdb.export_item(article(1, "Edited"))
+        couchdb.export_item(article(1, "Edited again"))
+        couchdb.finish_exporting()
+        assert stub.docs["1"]["title"] == "Edited again 1"
+        assert stub.docs["1"]["_rev"].startswith("2-")
+
+
+def test_waiting_documents_are_due_after_batch_interval():
+    with CouchDBStub() as stub:
+        couchdb = exporter(stub, batch_size=10, batch_interval=0)
+        couchdb.docs.append({"_id": "1"})
+        assert couchdb.take_due_docs() == [{"_id": "1"}]
+        assert couchdb.take_due_docs() is None
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+
+from parsers.exporters import FeedItems, ItemSpool, RSSExporter
+from parsers.items import Article, Author, Category, Image
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+CHANNEL = {
+    "title": "Stub News",
+    "link": "https://news.example.com",
+    "description": "Articles & <notes>",
+    "language": "zh-tw",
+    "image": Image(
+        url="https://news.example.com/logo.png",
+        title="Stub News",
+        link="https://news.example.com",
+        width=600,
+        height=315,
+    ),
+}
+
+
+def articles():
+    # Fixed ids, the defaults are random
+    return [
+        Article(
+            url="https://news.example.com/1",
+            title="Older article",
+            summary="First paragraph",
+            context="First paragraph\nSecond paragraph",
+            rich_context="<p>First paragraph</p><p>Second paragraph</p>",
+            id="1",
+            author=[Author("Reporter", id="a1")],
+            category=[Category("Local", id="c1")],
+            timestamp=datetime(2020, 10, 11, 8, 30, tzinfo=timezone.utc),
+            third_party="Wire",
+        ),
+        Article(
+            url="https://news.example.com/2?a=1&b=2",
+            title="Newer article with ]]> in the body",
+            summary="Summary",
+            context="Body ]]> text",
+            rich_context='<p>Body ]]&gt; text</p><img src="https://news.example.com/2.jpg">',
+            id="2",
+            image=Image(
+                url="https://news.example.com/2.jpg", type="image/jpeg", length=1024
+            ),
+            timestamp=datetime(2020, 10, 12, 9, 0, tzinfo=timezone.utc),
+            # No feed known, no <source>
+            third_party="Other wire",
+        ),
+        Article(
+            url="https://news.example.com/3",
+            title="Undated article",
+            summary="",
+            context="",
+            rich_context="",
+            id="3",
+        ),
+    ]
+
+
+def test_rss_exporter_matches_fixture():
+    file = BytesIO()
+    exporter = RSSExporter(
+        file,
+        CHANNEL,
+        indent=2,
+        source_feeds={"Wire": "https://wire.example.com/rss.xml"},
+    )
+    exporter.start_exporting()
+    for item in articles():
+        exporter.export_item(item)
+    exporter.finish_exporting()
+
+    with open(os.path.join(FIXTURES, "feed.xml"), "rb") as fixture:
+        assert file.getvalue() == fixture.read()
+
+
+def dated(number, title="New"):
+    return Article(
+        url=f"https://news.example.com/{number}",
+        title=f"{title} {number}",
+        summary="",
+        context="",
+        rich_context="",
+        id=str(number),
+        timestamp=datetime(2020, 10, 1, tzinfo=timezone.utc) + timedelta(hours=number),
+    )
+
+
+def test_item_spool_merges_spilled_runs_in_order():
+    spool = ItemSpool(key=lambda number: number, buffer_size=3)
+    numbers = [7, 3, 9, 1, 8, 2, 6, 0, 5, 4]
+    for number in numbers:
+        spool.append(number)
+    # Three runs of three spilled to disk, the last number still buffered
+    assert len(spool.runs) == 3 and spool.buffer == [4]
+    assert list(spool) == sorted(numbers)
+    spool.close()
+
+
+def test_item_spool_spills_by_size():
+    spool = ItemSpool(key=len, buffer_size=1000, buffer_bytes=10, sizeof=len)
+    for text in ("aaaa", "bbbbbb", "c", "dddddddd", "ee"):
+        spool.append(text)
+    assert len(spool.runs) == 2
+    assert list(spool) == ["c", "ee", "aaaa", "bbbbbb", "dddddddd"]
+
+
+def test_feed_items_dedupe_previous_items_across_spilled_runs():
+    items = FeedItems(buffer_size=2)
+    # Previous feed, newest first, some re-exported in this crawl
+    for number in range(9, -1, -1):
+        items.merge_previous(dated(number, "Old"))
+    for number in (12, 3, 10, 7, 11, 0):
+        items.append(dated(number))
+    assert len(items.item_spool.runs) == 3
+    assert len(items.previous_spool.runs) == 5
+
+    merged = [(item.id, item.title.split()[0]) for item in items]
+    assert [int(guid) for guid, _ in merged] == list(range(12, -1, -1))
+    assert {guid for guid, title in merged if title == "New"} == {
+        "12",
+        "11",
+        "10",
+        "7",
+        "3",
+        "0",
+    }
+    items.close()
+
+
+def test_feed_items_keep_max_items_newest():
+    items = FeedItems(buffer_size=2, max_items=3)
+    for number in (4, 1, 5, 2, 3):
+        items.append(dated(number))
+    assert [item.id for item in items] == ["5", "4", "3"]
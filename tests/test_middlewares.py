@@ -0,0 +1,193 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from scrapy import Spider
+from scrapy.core.downloader import Slot
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+
+from benchmarks.throttling import STUB_SLOTS
+from parsers.items import Article, Author
+from parsers.middlewares import (
+    AdaptiveConcurrencyMiddleware,
+    ConditionalRequestMiddleware,
+)
+
+URL = "https://tw.appledaily.com/local/20201012/1"
+STUB_URL = "http://127.0.0.1:8000"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Adaptive crawl of the site stub, in its own process for its own reactor
+STUB_CRAWL = """
+import json
+from twisted.internet import reactor
+from benchmarks.stubs import SiteStub
+from benchmarks.throttling import bench
+
+with SiteStub(latency=0.01, rate_limit=40) as stub:
+    d = bench(stub.url, archives=3, adaptive=True, concurrency=8)
+    d.addCallback(lambda result: print(json.dumps(result[1], default=str)))
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+"""
+
+
+def conditional_middleware():
+    crawler = get_crawler(
+        Spider,
+        {"CONDITIONAL_CACHE_ENABLED": True, "CONDITIONAL_CACHE_PATH": ":memory:"},
+    )
+    return ConditionalRequestMiddleware.from_crawler(crawler), Spider("test")
+
+
+def fetch(middleware, spider, status, headers=None):
+    request = Request(URL)
+    middleware.process_request(request, spider)
+    response = HtmlResponse(URL, status=status, headers=headers, request=request)
+    return request, middleware.process_response(request, response, spider)
+
+
+def test_not_modified_page_replays_cached_item():
+    middleware, spider = conditional_middleware()
+    article = Article(
+        url=URL,
+        title="Title",
+        summary="Summary",
+        context="Context",
+        rich_context="<p>Context</p>",
+        author=[Author("Reporter")],
+        timestamp=datetime(2020, 10, 12, tzinfo=timezone.utc),
+    )
+    request, response = fetch(
+        middleware,
+        spider,
+        200,
+        {"ETag": '"v1"', "Last-Modified": "Mon, 12 Oct 2020 00:00:00 GMT"},
+    )
+    assert b"If-None-Match" not in request.headers
+    # Yielded once the size of the article image is known
+    image = Response("https://img.appledaily.com.tw/1.jpg", request=Request(URL))
+    middleware.item_scraped(article, image, spider)
+
+    request, response = fetch(middleware, spider, 304)
+    assert request.headers["If-None-Match"] == b'"v1"'
+    assert request.headers["If-Modified-Since"] == b"Mon, 12 Oct 2020 00:00:00 GMT"
+    assert 304 in request.meta["handle_httpstatus_list"]
+    assert Article.from_dict(response.meta["cached_item"]) == article
+    assert middleware.stats.get_value("conditional/not_modified") == 1
+
+
+def test_page_without_item_is_not_revalidated():
+    middleware, spider = conditional_middleware()
+    # Archive page, no article parsed from it
+    fetch(middleware, spider, 200, {"ETag": '"v1"'})
+    request, _ = fetch(middleware, spider, 200)
+    assert b"If-None-Match" not in request.headers
+    assert middleware.store.get(URL) is None
+
+
+def test_changed_page_stores_new_validators_with_its_item():
+    middleware, spider = conditional_middleware()
+    for version in ("v1", "v2"):
+        request, response = fetch(middleware, spider, 200, {"ETag": f'"{version}"'})
+        article = Article(
+            url=URL, title=version, summary="", context="", rich_context=""
+        )
+        middleware.item_scraped(article, response, spider)
+    request, response = fetch(middleware, spider, 304)
+    assert request.headers["If-None-Match"] == b'"v2"'
+    assert response.meta["cached_item"]["title"] == "v2"
+    # The replayed item doesn't overwrite the stored page
+    middleware.item_scraped(
+        Article.from_dict(response.meta["cached_item"]), response, spider
+    )
+    assert middleware.store.get(URL)[0] == '"v2"'
+    assert middleware.stats.get_value("conditional/modified") == 2
+
+
+def adaptive_middleware():
+    crawler = get_crawler(
+        Spider,
+        {
+            "ADAPTIVE_CONCURRENCY_ENABLED": True,
+            "ADAPTIVE_CONCURRENCY_SLOTS": STUB_SLOTS,
+            "ADAPTIVE_CONCURRENCY_MAX_DELAY": 30,
+        },
+    )
+    # Download slots the middleware tunes, created by the downloader
+    crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={}))
+    return AdaptiveConcurrencyMiddleware.from_crawler(crawler), Spider("test")
+
+
+def download(middleware, spider, path, latency, status=200, headers=None):
+    request = Request(f"{STUB_URL}{path}")
+    middleware.process_request(request, spider)
+    slots = middleware.crawler.engine.downloader.slots
+    slots.setdefault(request.meta["download_slot"], Slot(8, 0, False))
+    request.meta["download_latency"] = latency
+    response = Response(request.url, status=status, headers=headers, request=request)
+    middleware.process_response(request, response, spider)
+    return slots[request.meta["download_slot"]]
+
+
+def test_request_kinds_get_their_own_slots():
+    middleware, spider = adaptive_middleware()
+    download(middleware, spider, "/archive/1", 0.01)
+    download(middleware, spider, "/article/1/1", 0.01)
+    download(middleware, spider, "/img/1/1.jpg", 0.01)
+    assert set(middleware.crawler.engine.downloader.slots) == {
+        "127.0.0.1/archive",
+        "127.0.0.1/article",
+        "127.0.0.1/image",
+    }
+
+
+def test_fast_responses_grow_concurrency_up_to_max():
+    middleware, spider = adaptive_middleware()
+    # One more after a window of as many fast responses as the concurrency
+    for _ in range(3):
+        slot = download(middleware, spider, "/article/1/1", 0.01)
+    assert slot.concurrency == 4
+    slot = download(middleware, spider, "/article/1/1", 0.01)
+    assert slot.concurrency == 5
+    for _ in range(200):
+        slot = download(middleware, spider, "/article/1/1", 0.01)
+    assert slot.concurrency == STUB_SLOTS["article"]["max_concurrency"]
+
+
+def test_rate_limit_halves_concurrency_and_delays_slot():
+    middleware, spider = adaptive_middleware()
+    headers = {"Retry-After": "2"}
+    slot = download(middleware, spider, "/img/1/1.jpg", 0.01, 429, headers)
+    assert (slot.concurrency, slot.delay) == (4, 2.0)
+    # Responses already in flight report the same congestion
+    slot = download(middleware, spider, "/img/1/1.jpg", 0.01, 429, headers)
+    assert slot.concurrency == 4
+    assert middleware.stats.get_value("adaptive/image/throttled") == 2
+
+
+def test_slow_responses_halve_concurrency():
+    middleware, spider = adaptive_middleware()
+    slot = download(middleware, spider, "/article/1/1", 2.0)
+    assert (slot.concurrency, slot.delay) == (2, 0.0)
+
+
+def test_adaptive_crawl_of_rate_limited_site_stub():
+    output = subprocess.run(
+        [sys.executable, "-c", STUB_CRAWL],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    stats = json.loads(output.stdout.splitlines()[-1])
+    # Every 429 is retried and slows its slot down
+    assert stats["item_scraped_count"] == 60
+    assert stats.get("downloader/response_status_count/429", 0) == sum(
+        stats.get(f"adaptive/{kind}/throttled", 0) for kind in STUB_SLOTS
+    )
+    assert stats["adaptive/archive/max_concurrency"] == 2
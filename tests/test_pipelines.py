@@ -0,0 +1,328 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.test import get_crawler
+
+from benchmarks.fixtures import synthetic_corpus
+from benchmarks.memory import HOSTS
+from benchmarks.stubs import CorpusStub
+from parsers import settings as project_settings
+from parsers.exporters import read_item_records, read_rss_items
+from parsers.items import Article
+from parsers.pipelines import (
+    ArchivePipeline,
+    ChangeDetectionPipeline,
+    NearDuplicatePipeline,
+    RSSPipeline,
+    SearchPipeline,
+)
+from parsers.spiders.appledaily import AppleDailySpider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# JOBDIR crawl of the corpus stub at argv[1] with archive and search index, in
+# its own process for its own reactor. With argv[2] "kill", the process is
+# killed after 10 items, before any pipeline is closed.
+JOB_CRAWL = """
+import dataclasses, json, os, signal, sqlite3, sys
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from parsers.spiders.appledaily import AppleDailySpider
+from parsers.spiders.archive import ArchiveSpider
+from parsers.stores import ArchiveStore
+
+url, kill = sys.argv[1], sys.argv[2] == "kill"
+settings = get_project_settings()
+settings.setdict({
+    "LOG_LEVEL": "ERROR",
+    "ROBOTSTXT_OBEY": False,
+    "CONDITIONAL_CACHE_ENABLED": False,
+    "ENCLOSURE_CACHE_PATH": ":memory:",
+    "RSS_OUTPUTS": ["xml"],
+    "JOBDIR": "job",
+    "ARCHIVE_ENABLED": True,
+    "SEARCH_ENABLED": True,
+    "ITEM_PIPELINES": {
+        "parsers.pipelines.RSSPipeline": 300,
+        "parsers.pipelines.ArchivePipeline": 400,
+        "parsers.pipelines.SearchPipeline": 450,
+    },
+})
+site = dataclasses.replace(
+    AppleDailySpider.site, archive_url=url + "/archive/{date}/", allowed_domains=[]
+)
+spider_class = type("StubSpider", (ArchiveSpider,), {"name": "stub", "site": site})
+process = CrawlerProcess(settings, install_root_handler=False)
+crawler = process.create_crawler(spider_class)
+scraped = []
+
+def item_scraped(item):
+    scraped.append(item.url)
+    if kill and len(scraped) == 10:
+        os.kill(os.getpid(), signal.SIGKILL)
+
+crawler.signals.connect(item_scraped, signal=signals.item_scraped)
+process.crawl(crawler, date="20201012")
+process.start()
+store = ArchiveStore("archive/stub")
+archived = [item.url for item in store.query()]
+indexed = sqlite3.connect("archive/stub/search.sqlite").execute(
+    "SELECT count(*) FROM documents WHERE guid IS NOT NULL"
+).fetchone()[0]
+print(json.dumps({"scraped": len(scraped), "archived": archived, "indexed": indexed}))
+"""
+
+
+def crawl(items, pipelines=(RSSPipeline,), date="20201012", **settings):
+    # Items through `pipelines` in order, as the item pipeline manager would
+    settings = {
+        **{
+            name: getattr(project_settings, name)
+            for name in dir(project_settings)
+            if name.isupper()
+        },
+        "RSS_INCREMENTAL": True,
+        "RSS_OUTPUTS": ["xml", "json"],
+        "ENCLOSURE_CACHE_PATH": ":memory:",
+        **settings,
+    }
+    crawler = get_crawler(AppleDailySpider, settings)
+    spider = AppleDailySpider(date=date)
+    spider._set_crawler(crawler)
+    pipelines = [pipeline_class.from_crawler(crawler) for pipeline_class in pipelines]
+    for pipeline in pipelines:
+        pipeline.open_spider(spider)
+    for item in items:
+        # Known articles are not requested
+        if item.url in spider.known_urls:
+            continue
+        try:
+            for pipeline in pipelines:
+                item = pipeline.process_item(item, spider)
+        except DropItem as e:
+            crawler.stats.inc_value(f"dropped/{type(e).__name__}")
+    for pipeline in pipelines:
+        pipeline.close_spider(spider)
+    return spider
+
+
+def feed_items(spider):
+    with open(f"{spider.file_name}.items.jsonl", "rb") as records:
+        return list(read_item_records(records))
+
+
+def feed_urls(spider):
+    with open(f"{spider.file_name}.xml", "rb") as feed:
+        return [item.url for item in read_rss_items(feed)]
+
+
+def article(number, context=None, updated=True):
+    return Article(
+        url=f"https://tw.appledaily.com/{number}",
+        title=f"Title {number}",
+        summary=f"Summary {number}",
+        context=context or f"Context {number}",
+        rich_context=f"<p>{context or f'Context {number}'}</p>",
+        subtitle=f"Subtitle {number}",
+        timestamp=datetime(2020, 10, 12, number, tzinfo=timezone.utc),
+        updated_at=(
+            datetime(2020, 10, 13, number, tzinfo=timezone.utc) if updated else None
+        ),
+    )
+
+
+def test_incremental_merge_keeps_all_fields(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    crawl([article(1), article(2)])
+    spider = crawl([article(3)])
+
+    assert spider.known_urls == {article(1).url, article(2).url}
+    merged = feed_items(spider)
+    expected = [article(3), article(2), article(1)]
+    # Ids are random, everything else survives the round trip
+    for item in merged + expected:
+        item.id = None
+    assert merged == expected
+
+
+def test_incremental_needs_rss_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError):
+        crawl([], RSS_OUTPUTS=["json"])
+
+
+def test_unchanged_items_are_dropped_and_kept_in_feed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (ChangeDetectionPipeline, RSSPipeline)
+    crawl([article(1, updated=False), article(2, updated=False)], pipelines)
+    # Re-crawled: 1 unchanged but for whitespace, 2 edited
+    spider = crawl(
+        [
+            article(1, "Context \n 1", updated=False),
+            article(2, "Edited", updated=False),
+        ],
+        pipelines,
+        RSS_INCREMENTAL_SKIP_KNOWN=False,
+    )
+    stats = spider.crawler.stats
+    assert stats.get_value("change/unchanged") == 1
+    assert stats.get_value("change/updated") == 1
+    assert stats.get_value("dropped/UnchangedItem") == 1
+
+    items = {item.url: item for item in feed_items(spider)}
+    assert len(items) == 2
+    assert items[article(1).url].updated_at is None
+    assert items[article(2).url].context == "Edited"
+    assert items[article(2).url].updated_at is not None
+
+
+def test_known_items_are_not_crawled_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (ChangeDetectionPipeline, RSSPipeline)
+    crawl([article(1, updated=False)], pipelines)
+    spider = crawl(
+        [article(1, "Edited", updated=False), article(2, updated=False)], pipelines
+    )
+    # Skipped before change detection, the edit is not seen
+    assert spider.crawler.stats.get_value("change/updated") is None
+    assert spider.crawler.stats.get_value("change/new") == 1
+    items = {item.url: item for item in feed_items(spider)}
+    assert items[article(1).url].context == "Context 1"
+    assert set(items) == {article(1).url, article(2).url}
+
+
+def test_items_are_new_in_another_feed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (ChangeDetectionPipeline, RSSPipeline)
+    crawl([article(1, updated=False)], pipelines, date="20201012")
+    # Same article crawled for the feed of another date, not in that feed yet
+    spider = crawl([article(1, updated=False)], pipelines, date="20201011")
+    assert spider.crawler.stats.get_value("change/new") == 1
+    assert [item.url for item in feed_items(spider)] == [article(1).url]
+
+
+def wire_story(number, edit=""):
+    words = " ".join(f"word{n}" for n in range(40))
+    return article(number, context=f"{words} {edit}")
+
+
+def test_near_duplicates_kept_unless_enabled():
+    with pytest.raises(NotConfigured):
+        NearDuplicatePipeline.from_crawler(get_crawler(settings_dict={}))
+
+
+def test_near_duplicate_dropped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (NearDuplicatePipeline, RSSPipeline)
+    spider = crawl(
+        [wire_story(1), wire_story(2, "edit"), article(3)],
+        pipelines,
+        NEAR_DUPLICATE_ENABLED=True,
+    )
+
+    assert feed_urls(spider) == [
+        article(3).url,
+        article(1).url,
+    ]
+    assert spider.crawler.stats.get_value("near_duplicate/dropped") == 1
+
+
+def test_near_duplicate_updated_article_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (NearDuplicatePipeline, RSSPipeline)
+    crawl([wire_story(1)], pipelines, NEAR_DUPLICATE_ENABLED=True)
+    # Same url, not in known_urls when the feed is rebuilt
+    spider = crawl(
+        [wire_story(1, "edit")],
+        pipelines,
+        NEAR_DUPLICATE_ENABLED=True,
+        RSS_INCREMENTAL=False,
+    )
+
+    assert feed_urls(spider) == [article(1).url]
+
+
+def test_rebuilt_feed_keeps_duplicates_of_previous_crawls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (NearDuplicatePipeline, RSSPipeline)
+    for incremental in (True, False):
+        crawl(
+            [wire_story(1)],
+            pipelines,
+            NEAR_DUPLICATE_ENABLED=True,
+            RSS_INCREMENTAL=incremental,
+        )
+    spider = crawl(
+        [wire_story(2, "edit")],
+        pipelines,
+        NEAR_DUPLICATE_ENABLED=True,
+        RSS_INCREMENTAL=False,
+    )
+
+    assert feed_urls(spider) == [article(2).url]
+
+
+def test_incremental_feed_drops_duplicates_of_previous_crawls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pipelines = (NearDuplicatePipeline, RSSPipeline)
+    crawl([wire_story(1)], pipelines, NEAR_DUPLICATE_ENABLED=True)
+    spider = crawl([wire_story(2, "edit")], pipelines, NEAR_DUPLICATE_ENABLED=True)
+
+    assert feed_urls(spider) == [article(1).url]
+
+
+def test_archive_only_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(NotConfigured):
+        ArchivePipeline.from_crawler(get_crawler(settings_dict={}))
+    crawl([article(1)], (ArchivePipeline, RSSPipeline), ARCHIVE_ENABLED=True)
+
+    assert os.listdir("archive/appledaily/2020-10-12") == ["_.jsonl"]
+
+
+def test_search_index_only_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(NotConfigured):
+        SearchPipeline.from_crawler(get_crawler(settings_dict={}))
+    spider = crawl([article(1)], (SearchPipeline, RSSPipeline), SEARCH_ENABLED=True)
+
+    assert spider.crawler.stats.get_value("search/indexed") == 1
+    assert os.path.exists("archive/appledaily/search.sqlite")
+
+
+# Project settings outside the project directory
+ENV = {**os.environ, "PYTHONPATH": ROOT, "SCRAPY_SETTINGS_MODULE": "parsers.settings"}
+
+
+def test_killed_job_resumes_archive_and_search_index(tmp_path):
+    corpus = synthetic_corpus(articles=20, paragraphs=3)
+    with CorpusStub(corpus, HOSTS, 0.0) as stub:
+        killed = subprocess.run(
+            [sys.executable, "-c", JOB_CRAWL, stub.url, "kill"],
+            cwd=tmp_path,
+            env=ENV,
+            capture_output=True,
+            text=True,
+        )
+        assert killed.returncode == -9
+        output = subprocess.run(
+            [sys.executable, "-c", JOB_CRAWL, stub.url, "resume"],
+            cwd=tmp_path,
+            env=ENV,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    result = json.loads(output.stdout.splitlines()[-1])
+
+    # Articles exported before the kill are not requested again, but archived
+    # and indexed from the journal
+    assert result["scraped"] == 10
+    assert len(set(result["archived"])) == len(result["archived"]) == 20
+    assert result["indexed"] == 20
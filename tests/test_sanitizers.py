@@ -0,0 +1,76 @@
+from lxml import html
+
+from parsers.sanitizers import HTMLSanitizer, truncate_html
+
+sanitize = HTMLSanitizer()
+
+
+def test_scripts_and_ads_are_removed_with_their_content():
+    markup = (
+        "<p>Text</p><script>track()</script><style>p {}</style>"
+        '<ins class="adsbygoogle" data-ad-slot="1"></ins>'
+        '<div class="ad-banner">Buy</div><div id="sponsored">Sponsored</div>'
+        "<!-- comment -->"
+    )
+    assert sanitize(markup) == "<p>Text</p>"
+
+
+def test_inserted_text_is_kept():
+    markup = "<p>Price <del>10</del> <ins>12</ins> dollars</p>"
+    assert sanitize(markup) == "<p>Price 10 12 dollars</p>"
+
+
+def test_attributes_are_allowlisted_and_urls_made_absolute():
+    markup = (
+        '<p class="lead" onclick="x()"><a href="/news/1" target="_blank">1</a>'
+        '<a href="javascript:alert(1)">2</a></p>'
+    )
+    assert sanitize(markup, base_url="https://tw.appledaily.com/local/") == (
+        '<p><a href="https://tw.appledaily.com/news/1">1</a><a>2</a></p>'
+    )
+
+
+def test_lazy_images_get_their_real_url():
+    markup = (
+        '<figure><img src="placeholder.gif" data-src="https://img.example.com/1.jpg">'
+        "<figcaption>Caption</figcaption></figure><p><img></p>"
+    )
+    assert sanitize(markup) == (
+        '<figure><img src="https://img.example.com/1.jpg">'
+        "<figcaption>Caption</figcaption></figure>"
+    )
+
+
+def test_whitespace_is_collapsed_outside_pre():
+    markup = "<div>\n  <p>One   two\n three</p>\n  <pre>a\n  b</pre>\n</div>"
+    assert sanitize(markup) == "<div><p>One two three</p><pre>a\n  b</pre></div>"
+
+
+def test_unknown_tags_are_replaced_by_their_content():
+    assert sanitize("<section><p>Text <font>big</font></p></section>") == (
+        "<p>Text big</p>"
+    )
+
+
+def test_truncate_keeps_markup_that_fits():
+    markup = "<p>One</p><p>Two</p>"
+    assert truncate_html(markup, 1000) == markup
+
+
+def test_truncate_cuts_between_elements_and_in_text():
+    markup = "<p>First paragraph</p><p>Second <b>bold</b> paragraph</p>"
+    truncated = truncate_html(markup, 30)
+    # Room left for "<p></p>" and one character
+    assert truncated == "<p>First paragraph</p><p>S</p>"
+
+
+def test_truncate_stays_well_formed_and_within_budget():
+    markup = "".join(f"<p>段落 {n} <a href='/{n}'>連結</a> 文字</p>" for n in range(50))
+    text = html.fragment_fromstring(markup, create_parent="div").text_content()
+    for max_bytes in (10, 100, 1000):
+        truncated = truncate_html(markup, max_bytes)
+        assert len(truncated.encode()) <= max_bytes
+        wrapper = html.fragment_fromstring(truncated, create_parent="div")
+        # Closed tags, parsed back to the same markup, and the leading text
+        assert html.tostring(wrapper, encoding="unicode") == f"<div>{truncated}</div>"
+        assert text.startswith(wrapper.text_content())
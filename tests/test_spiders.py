@@ -0,0 +1,122 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from parsers.items import Article
+from parsers.spiders.appledaily import AppleDailySpider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_SIZE = 4 * 1024 * 1024
+
+# Crawl of the corpus stub, in its own process for its own reactor. The stub
+# answers HEAD with 405 and ignores Range, like some image servers.
+STUB_CRAWL = f"""
+import dataclasses, json, os, tempfile
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+from benchmarks.fixtures import synthetic_corpus
+from benchmarks.memory import HOSTS
+from benchmarks.stubs import CorpusStub
+from parsers.exporters import read_rss_items
+from parsers.spiders.appledaily import AppleDailySpider
+from parsers.spiders.archive import ArchiveSpider
+
+settings = get_project_settings()
+settings.set("LOG_LEVEL", "ERROR")
+settings.set("ROBOTSTXT_OBEY", False)
+settings.set("CONDITIONAL_CACHE_ENABLED", False)
+settings.set("ENCLOSURE_CACHE_PATH", ":memory:")
+settings.set("RSS_OUTPUTS", ["xml"])
+settings.set("ITEM_PIPELINES", {{"parsers.pipelines.RSSPipeline": 300}})
+corpus = synthetic_corpus(articles=20, paragraphs=3)
+with CorpusStub(corpus, HOSTS, 0.0, {IMAGE_SIZE}) as stub:
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        site = dataclasses.replace(
+            AppleDailySpider.site,
+            archive_url=stub.url + "/archive/{{date}}/",
+            allowed_domains=[],
+        )
+        spider_class = type(
+            "StubSpider", (ArchiveSpider,), {{"name": "stub", "site": site}}
+        )
+        process = CrawlerProcess(settings, install_root_handler=False)
+        crawler = process.create_crawler(spider_class)
+        process.crawl(crawler, date="20201012")
+        process.start()
+        with open("stub_20201012.xml", "rb") as feed:
+            images = [int(item.image.length) for item in read_rss_items(feed)]
+print(json.dumps({{"images": images, "stats": crawler.stats.get_stats()}}, default=str))
+"""
+
+
+def test_date_range_is_newest_first():
+    spider = AppleDailySpider(start="20201010", end="20201012", split="1")
+    assert spider.file_name == "appledaily_20201010_20201012"
+    assert spider.file_names == [
+        "appledaily_20201012",
+        "appledaily_20201011",
+        "appledaily_20201010",
+    ]
+    assert len(spider.start_urls) == 3
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        ({"start": "2020-10-10", "end": "20201012"}, "start must be a date"),
+        ({"date": "20201301"}, "date must be a date"),
+        ({"start": "20201012", "end": "20201010"}, "is after end"),
+        ({"days": "0"}, "at least 1"),
+        ({"days": "a week"}, "must be a number"),
+        ({"end": "20201012"}, "needs start or days"),
+        ({"date": "20201012", "days": "2"}, "can't be combined"),
+        ({"start": "20201010", "days": "2"}, "can't be combined"),
+    ],
+)
+def test_bad_date_arguments(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        AppleDailySpider(**kwargs)
+
+
+def test_dates_in_the_future():
+    future = (datetime.now() + timedelta(days=3)).strftime("%Y%m%d")
+    with pytest.raises(ValueError, match="in the future"):
+        AppleDailySpider(start="20201010", end=future)
+    with pytest.raises(ValueError, match="in the future"):
+        AppleDailySpider(date=future)
+    # Starting in the future ends before starting
+    with pytest.raises(ValueError, match="is after end"):
+        AppleDailySpider(start=future)
+
+
+def test_undated_article_goes_to_newest_feed_when_split():
+    spider = AppleDailySpider(start="20201010", end="20201012", split="1")
+    article = Article(url="u", title="", summary="", context="", rich_context="")
+    assert spider.get_file_name(article) == "appledaily_20201012"
+    article.timestamp = spider.timezone.localize(datetime(2020, 10, 11, 8))
+    assert spider.get_file_name(article) == "appledaily_20201011"
+
+
+def test_image_size_without_head_or_range():
+    output = subprocess.run(
+        [sys.executable, "-c", STUB_CRAWL],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(output.stdout.splitlines()[-1])
+    stats = result["stats"]
+    # Every enclosure has the length of its image
+    assert result["images"] == [IMAGE_SIZE] * 20
+    # HEAD refused, then the GET asking for one byte got the whole image
+    # until the download was stopped at its headers
+    head_refused = stats["downloader/response_status_count/405"]
+    assert head_refused >= 20
+    assert stats["downloader/response_count"] == 1 + 20 + 2 * head_refused
+    assert stats["downloader/response_bytes"] < IMAGE_SIZE
@@ -0,0 +1,141 @@
+import os
+from datetime import date, datetime, timezone
+
+from parsers.items import Article, Category
+from parsers.stores import ArchiveStore, MinHashStore, SearchIndex, _search_tokens
+
+WORDS = [f"word{number}" for number in range(60)]
+
+
+def article(number, day=12, category="財經", context=None):
+    return Article(
+        url=f"https://news.example.com/{number}",
+        id=f"id-{number}",
+        title=f"Title {number}",
+        summary=f"Summary {number}",
+        context=context or f"Context {number}",
+        rich_context=f"<p>{context or f'Context {number}'}</p>",
+        category=[Category(name=category, id=category)] if category else [],
+        timestamp=datetime(2020, 10, day, number, tzinfo=timezone.utc),
+    )
+
+
+def test_archive_partitions_and_index_round_trip(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    items = [article(1), article(2, category="國際"), article(3, day=13)]
+    for item in items:
+        assert store.add(item)
+    store.close()
+
+    assert sorted(
+        os.path.relpath(os.path.join(directory, name), tmp_path)
+        for directory, _, names in os.walk(tmp_path)
+        for name in names
+        if name.endswith(".jsonl")
+    ) == ["2020-10-12/國際.jsonl", "2020-10-12/財經.jsonl", "2020-10-13/財經.jsonl"]
+    # Read back by a new store, from the index
+    store = ArchiveStore(str(tmp_path))
+    assert store.get(items[1].url) == items[1]
+    assert store.get("https://news.example.com/missing") is None
+    assert list(store.query()) == [items[2], items[1], items[0]]
+    assert list(store.query(start=date(2020, 10, 13))) == [items[2]]
+    assert list(store.query(end=date(2020, 10, 12), category="財經")) == [items[0]]
+    assert list(store.query(limit=1)) == [items[2]]
+    store.close()
+
+
+def test_archive_keeps_latest_record(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    assert store.add(article(1))
+    # Same article crawled again, only its random ids differ
+    assert not store.add(Article(**{**vars(article(1)), "id": "other"}))
+    updated = article(1, context="Updated")
+    assert store.add(updated)
+
+    assert store.get(updated.url) == updated
+    assert list(store.query()) == [updated]
+    store.close()
+
+
+def text(words):
+    return " ".join(words)
+
+
+def test_search_tokens_cjk_bigrams():
+    assert _search_tokens("台積電 TSMC營收") == ["台積", "積電", "tsmc", "營收"]
+    # Full-width forms are normalized, single characters kept whole
+    assert _search_tokens("ＡＢＣ 颱") == ["abc", "颱"]
+    assert _search_tokens(" ,. ") == []
+
+
+def test_search_index_query(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite"))
+    assert index.add(article(1, context="台積電第三季營收創新高"))
+    assert index.add(article(2, category="國際", context="颱風逼近，台積電停工"))
+    assert index.add(article(3, context="股市收盤"))
+
+    urls = [item.url for item in (article(1), article(2), article(3))]
+    # All words match, newest first
+    assert index.search("台積電") == [urls[1], urls[0]]
+    assert index.search("台積電 營收") == [urls[0]]
+    assert index.search("台積電", category="國際") == [urls[1]]
+    assert index.search("台積電", limit=1) == [urls[1]]
+    # Single character matches the bigrams it starts
+    assert index.search("颱") == [urls[1]]
+    # Titles are indexed, the bigrams of a word must be adjacent
+    assert index.search("title 3") == [urls[2]]
+    assert index.search("積台") == []
+    assert index.search("  ") == []
+    index.close()
+
+
+def test_search_index_updated_article(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite"))
+    assert index.add(article(1, context="颱風來襲"))
+    assert not index.add(article(1, context="颱風來襲"))
+    assert index.add(article(1, context="地震"))
+
+    assert index.search("颱風") == []
+    assert index.search("地震") == [article(1).url]
+    index.close()
+
+
+def test_minhash_signature_needs_enough_tokens():
+    assert MinHashStore.signature(text(WORDS[:19])) is None
+    assert MinHashStore.signature(text(WORDS[:20])) is not None
+
+
+def test_minhash_similarity_estimates_jaccard():
+    signature = MinHashStore.signature(text(WORDS))
+    assert MinHashStore.similarity(signature, signature) == 1
+    # Token order and repetition don't matter
+    shuffled = MinHashStore.signature(text(reversed(WORDS + WORDS)))
+    assert MinHashStore.similarity(signature, shuffled) == 1
+    unrelated = MinHashStore.signature(text(f"other{n}" for n in range(60)))
+    assert MinHashStore.similarity(signature, unrelated) < 0.2
+
+
+def test_minhash_store_finds_near_duplicates():
+    store = MinHashStore(":memory:")
+    store.set("a", MinHashStore.signature(text(WORDS)))
+    store.set("b", MinHashStore.signature(text(f"other{n}" for n in range(60))))
+
+    # 2 of 60 words changed: Jaccard similarity 58 / 62
+    edited = MinHashStore.signature(text(WORDS[:58] + ["edit1", "edit2"]))
+    url, similarity = store.find(edited, 0.7)
+    assert url == "a"
+    assert 0.7 <= similarity < 1
+    assert store.find(edited, 0.7, exclude="a") is None
+    unrelated = MinHashStore.signature(text(f"third{n}" for n in range(60)))
+    assert store.find(unrelated, 0.7) is None
+    store.close()
+
+
+def test_minhash_store_set_replaces_signature():
+    store = MinHashStore(":memory:")
+    store.set("a", MinHashStore.signature(text(WORDS)))
+    store.set("a", MinHashStore.signature(text(f"other{n}" for n in range(60))))
+
+    assert store.find(MinHashStore.signature(text(WORDS)), 0.7) is None
+    assert store.find(MinHashStore.signature(text(f"other{n}" for n in range(60))), 0.7)
+    store.close()